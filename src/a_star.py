@@ -1,73 +1,395 @@
-from queue import PriorityQueue
+from array import array
+from heapq import heappush, heappop
+import weakref
+
+"""
+The PathFinder class is an A* search engine bound to the grid of a World.
+All the per-square bookkeeping (g-scores and where each square was reached from)
+lives in flat arrays that are allocated once and reused by every search. Instead of clearing them,
+each search increments a generation number and an entry only counts if its stamp equals the current generation.
+When a shorter way to a square in the frontier is found, the square is pushed again
+and the old entry is skipped when it comes up, so every square is expanded with its shortest distance.
+
+The default heuristic is the Manhattan distance, which ignores walls and underestimates badly on maps full of them.
+A PathFinder can instead use landmarks (ALT: A*, landmarks and the triangle inequality): the exact wall-aware
+distances from a few squares spread over the map. For any landmark L, |d(L,goal) - d(L,n)| is a lower bound
+on the distance from n to the goal, so the largest such bound is still an admissible heuristic, and a much tighter one.
+
+The function a_star() is kept for compatibility and runs its search on the shared PathFinder of the grid,
+or on the pathfinder chosen for the grid with select(), such as a HierarchicalPathFinder.
+"""
+
+_finders = weakref.WeakKeyDictionary()  # One shared PathFinder for every Grid
+_landmarks = weakref.WeakKeyDictionary()  # The Landmarks of every Grid that has used them
+_selected = weakref.WeakKeyDictionary()  # Pathfinders chosen with select() instead of the shared PathFinder
 
-def get_path(last_visited, current):
-    path_length = 0
-    while current in last_visited:
-        current = last_visited[current] # What square did current come from
-        path_length += 1
-    return path_length
 
 def distance(point1, point2):
     x1, y1 = point1
     x2, y2 = point2
     return abs(x1 - x2) + abs(y1 - y2)
 
-def a_star(grid, start, end, AI):
+
+class Landmarks():
     """
-    Parameter AI is True if the function is called from the AI's moving algortihm.
-    This is important because the function has different return values with different values of 'AI'
+    Breadth-first distance arrays from count landmarks of a grid, computed over the squares that aren't walls.
+    Units are ignored, as they only make paths longer and the bounds stay admissible.
+
+    Every area of connected squares gets up to count landmarks, chosen by farthest-point selection: the first is
+    the square farthest from the first square of the area, and every next one is the square farthest from all landmarks
+    of the area chosen so far, so they end up on the edges of the map and behind walls, where they give the best bounds.
+    The distances are valid until the walls change, see is_valid().
+    Like a PathFinder, the landmarks only keep a weak reference to their grid, so _landmarks doesn't keep it alive.
     """
+    UNREACHABLE = -1
+
+    def __init__(self, grid, count=8):
+        self.grid_ref = weakref.ref(grid)
+        self.count = count
+        self.landmarks = []  # Flat indices of the landmarks of every area
+        self.distances = []  # The i-th array has the distances from the i-th landmark of each area, UNREACHABLE for walls
+        self.version = grid.obstacle_version
+        self.expanded = 0  # Number of squares expanded by breadth_first, for every area and landmark in select()
+        self.select()
+
+    @classmethod
+    def for_grid(cls, grid, count=8):
+        """
+        Returns the Landmarks of grid, computing them again if the walls have changed since
+        """
+        landmarks = _landmarks.get(grid)
+        if landmarks is None or landmarks.count != count or not landmarks.is_valid():
+            landmarks = cls(grid, count)
+            _landmarks[grid] = landmarks
+        return landmarks
+
+    @property
+    def grid(self):
+        return self.grid_ref()
+
+    def is_valid(self):
+        return self.version == self.grid.obstacle_version
+
+    def breadth_first(self, source, distances=None):
+        """
+        Returns an array of the number of steps from the flat index source to every square, walls excluded.
+        If distances is given, the steps are written into it instead, and only over squares it has as UNREACHABLE.
+        :return: (the array, list of the squares reached in order of distance) if distances is given
+        """
+        grid = self.grid
+        width = grid.width
+        height = grid.height
+        obstacles = grid.obstacles
+        fresh = distances is None
+        if fresh:
+            distances = array("i", [Landmarks.UNREACHABLE]) * (width * height)
+        distances[source] = 0
+        reached = [source]
+        layer = reached
+        steps = 0
+
+        while layer:
+            steps += 1
+            self.expanded += len(layer)
+            next_layer = []
+            for current in layer:
+                x, y = divmod(current, height)
+                for neighbour, free in ((current - 1, y > 0), (current + height, x < width - 1),
+                                        (current + 1, y < height - 1), (current - height, x > 0)):
+                    if free and not obstacles[neighbour] and distances[neighbour] == Landmarks.UNREACHABLE:
+                        distances[neighbour] = steps
+                        next_layer.append(neighbour)
+            if not fresh:
+                reached.extend(next_layer)
+            layer = next_layer
+
+        if fresh:
+            return distances
+        return distances, reached
+
+    def select(self):
+        """
+        Chooses the landmarks by farthest-point selection and computes their distance arrays.
+        Every area of connected squares gets its own landmarks. The areas don't overlap, so the i-th distance array
+        holds the distances from the i-th landmark of the area of each square. Squares in two different areas
+        get meaningless bounds, but no path joins them anyway.
+        """
+        obstacles = self.grid.obstacles
+        size = len(obstacles)
+
+        # One pass labels the areas: a square is seen once it has a distance from the first square of its area.
+        # Those distances also stand in for a landmark at the start of each area.
+        nearest = array("i", [Landmarks.UNREACHABLE]) * size  # Distance from every square to the closest landmark
+        areas = []
+        for index in range(size):
+            if not obstacles[index] and nearest[index] == Landmarks.UNREACHABLE:
+                areas.append(self.breadth_first(index, nearest)[1])
+        areas.sort(key=len, reverse=True)  # The largest area, where nearly all the searches are, comes first
+
+        for squares in areas:
+            for i in range(self.count):
+                farthest = max(squares, key=nearest.__getitem__)
+                if i > 0 and nearest[farthest] <= 0:  # Every square of the area is a landmark already
+                    break
+                if i == len(self.distances):
+                    self.distances.append(array("i", [Landmarks.UNREACHABLE]) * size)
+                distances = self.breadth_first(farthest, self.distances[i])[0]
+                self.landmarks.append(farthest)
+                self.closer(nearest, distances, squares)
+
+    @staticmethod
+    def closer(nearest, distances, squares):
+        """
+        Lowers the entries of nearest to distances for squares where those are smaller
+        """
+        for index in squares:
+            if distances[index] < nearest[index]:
+                nearest[index] = distances[index]
+
+    def bound(self, start, end):
+        """
+        Returns the largest lower bound the landmarks give on the distance between two flat indices
+        """
+        best = 0
+        for distances in self.distances:
+            d_start = distances[start]
+            d_end = distances[end]
+            if d_start >= 0 and d_end >= 0 and abs(d_end - d_start) > best:
+                best = abs(d_end - d_start)
+        return best
+
+
+class PathFinder():
+    """
+    The finder only keeps a weak reference to its grid, so the shared finders in _finders
+    don't keep their grids alive and are dropped together with them.
+    """
+
+    def __init__(self, world):
+        self.bind(world.get_grid())
+
+    @classmethod
+    def for_grid(cls, grid):
+        """
+        Returns the shared PathFinder of grid, creating it on first use
+        """
+        finder = _finders.get(grid)
+        if finder is None:
+            finder = cls.__new__(cls)
+            finder.bind(grid)
+            _finders[grid] = finder
+        return finder
+
+    def bind(self, grid):
+        """
+        Allocates the search buffers for grid
+        """
+        size = grid.width * grid.height
+        self.grid_ref = weakref.ref(grid)
+        self.g_score = array("i", [0]) * size  # Shortest known distance from start to each square
+        self.last_visited = array("i", [0]) * size  # The square each square was reached from
+        self.visited = array("I", [0]) * size  # Generation in which g_score and last_visited were written
+        self.frontier = []
+        self.generation = 0
+        self.expanded = 0  # Number of squares expanded by the latest search
+        self.landmark_count = 0  # Number of landmarks for the heuristic, 0 for the Manhattan distance
+
+    def use_landmarks(self, count=8):
+        """
+        Makes search() use the landmark heuristic with count landmarks, or the Manhattan distance if count is 0.
+        The landmarks are computed by the first search and again whenever the walls change.
+        """
+        self.landmark_count = count
+
+    @property
+    def grid(self):
+        return self.grid_ref()
 
-    count = 0
-    pq = PriorityQueue()
-    pq.put((0, count, start))
-    last_visited = {}
-    g_score = {square: float("inf") for row in grid for square in row} # Shortest distance from start to current
-    g_score[start] = 0
+    def next_generation(self):
+        """
+        Starts a new search generation. The stamps are cleared only when the counter would overflow.
+        """
+        self.generation += 1
+        if self.generation == 0xFFFFFFFF:
+            size = len(self.visited)
+            self.visited = array("I", [0]) * size
+            self.generation = 1
+        return self.generation
 
-    f_score = {square: float("inf") for row in grid for square in row} # Manhattan distance from current to end
-    f_score[start] = distance(start.get_location(), end.get_location())
+    def search(self, start, end):
+        """
+        Finds the shortest path between two squares.
+        start and end are tuples of (x,y) coordinates.
 
-    pq_hash = {start}
+        Returns the path as a list of (x,y) tuples from start to end and its length in steps.
+        If end can't be reached, returns (None, float("inf")).
+        """
+        grid = self.grid
+        height = grid.height
+        masks = grid.neighbour_masks
+        g_score = self.g_score
+        last_visited = self.last_visited
+        visited = self.visited
+        steps = (-1, height, 1, -height)  # LEFT, DOWN, RIGHT, UP as index offsets
 
-    while not pq.empty():
-        current = pq.get()[2]
-        pq_hash.remove(current) # Synq hash dictionary with priority queue
+        generation = self.next_generation()
+        frontier = self.frontier
+        frontier.clear()
+        expanded = 0
 
-        if current == end:
-            if not AI:
-                return get_path(last_visited, end)
-            else:
-                return getpath(last_visited, end)
+        start_index = start[0] * height + start[1]
+        end_index = end[0] * height + end[1]
+        end_x, end_y = end
 
-        for neighbour in current.neighbours:
-            temp_g_score = g_score[current] + 1 # The distance from current to its neighbour
+        bounds = ()  # (distances from a landmark, the landmark's distance to end) for the landmark heuristic
+        if self.landmark_count:
+            landmarks = Landmarks.for_grid(grid, self.landmark_count)
+            bounds = [(distances, distances[end_index]) for distances in landmarks.distances
+                      if distances[end_index] >= 0]
 
-            if temp_g_score < g_score[neighbour]:   # If it's shorter than the currently known distance, update it
-                last_visited[neighbour] = current
-                g_score[neighbour] = temp_g_score
-                f_score[neighbour] = temp_g_score + distance(neighbour.get_location(), end.get_location())
-                if neighbour not in pq_hash:
+        count = 0
+        heappush(frontier, (0, count, start_index, 0))
+        g_score[start_index] = 0
+        visited[start_index] = generation
+
+        while frontier:
+            entry = heappop(frontier)
+            current = entry[2]
+            if entry[3] != g_score[current]:  # A shorter way to current was found after this entry was pushed
+                continue
+
+            if current == end_index:
+                self.expanded = expanded
+                return self.get_path(start_index, end_index)
+
+            expanded += 1
+            mask = masks[current]
+            temp_g_score = g_score[current] + 1  # The distance from current to its neighbours
+
+            for i in range(4):
+                if not mask & (1 << i):
+                    continue
+                neighbour = current + steps[i]
+
+                # If it's shorter than the currently known distance, update it
+                if visited[neighbour] != generation or temp_g_score < g_score[neighbour]:
+                    last_visited[neighbour] = current
+                    g_score[neighbour] = temp_g_score
+                    visited[neighbour] = generation
+                    nx, ny = divmod(neighbour, height)
+                    estimate = abs(nx - end_x) + abs(ny - end_y)
+                    for distances, d_end in bounds:
+                        d_neighbour = distances[neighbour]
+                        if d_neighbour >= 0 and abs(d_end - d_neighbour) > estimate:
+                            estimate = abs(d_end - d_neighbour)
                     count += 1
-                    pq.put((f_score[neighbour], count, neighbour))
-                    pq_hash.add(neighbour)
+                    heappush(frontier, (temp_g_score + estimate, count, neighbour, temp_g_score))
 
-    if not AI:
-        return float("inf")
-    else:
-        return None, False
+        self.expanded = expanded
+        return None, float("inf")
 
+    def first_reachable(self, start, goals):
+        """
+        A breadth-first search from start towards all squares in goals at once.
+        start is a tuple of (x,y) coordinates and goals a list of them in order of preference.
 
-def getpath(last_visited, current):
-    path = [current]
-    while current in last_visited:
-        current = last_visited[current] # What square did current come from
-        path.append(current)
+        Returns the first goal in the list that can be reached from start, or None if none of them can.
+        The search stops as soon as the most preferred goal is found.
+        """
+        height = self.grid.height
+        masks = self.grid.neighbour_masks
+        visited = self.visited
+        steps = (-1, height, 1, -height)  # LEFT, DOWN, RIGHT, UP as index offsets
 
-    return path, True
+        generation = self.next_generation()
+        ranks = {x * height + y: rank for rank, (x, y) in enumerate(goals)}
+        best = len(goals)
+        expanded = 0
 
+        start_index = start[0] * height + start[1]
+        visited[start_index] = generation
+        layer = [start_index]
 
+        while layer and best != 0:
+            next_layer = []
+            for current in layer:
+                expanded += 1
+                mask = masks[current]
+                for i in range(4):
+                    if not mask & (1 << i):
+                        continue
+                    neighbour = current + steps[i]
+                    if visited[neighbour] == generation:
+                        continue
+                    visited[neighbour] = generation
+                    next_layer.append(neighbour)
 
+                    rank = ranks.get(neighbour)
+                    if rank is not None and rank < best:
+                        best = rank
+            layer = next_layer
 
+        self.expanded = expanded
+        if best == len(goals):
+            return None
+        return goals[best]
 
+    def get_path(self, start_index, end_index):
+        """
+        Walks back from end to start and returns the path (list of (x,y) tuples from start to end)
+        together with its length in steps.
+        """
+        height = self.grid.height
+        last_visited = self.last_visited
+        path = [divmod(end_index, height)]
+        current = end_index
+        while current != start_index:
+            current = last_visited[current]  # What square did current come from
+            path.append(divmod(current, height))
+
+        path.reverse()
+        return path, len(path) - 1
+
+
+def select(grid, finder):
+    """
+    Makes finder the pathfinder of grid for a_star() and World.get_pathfinder().
+    finder needs search() and first_reachable() like a PathFinder. None goes back to the shared PathFinder.
+    A finder that is replaced is detached from the grid if it has a detach() method, like a HierarchicalPathFinder.
+    finder must not keep grid alive, or the entry in _selected never goes away.
+    """
+    previous = _selected.get(grid)
+    if previous is not None and previous is not finder and hasattr(previous, "detach"):
+        previous.detach()
+
+    if finder is None:
+        _selected.pop(grid, None)
+    else:
+        _selected[grid] = finder
+
+
+def get_finder(grid):
+    """
+    Returns the pathfinder chosen for grid with select(), or the shared PathFinder of grid
+    """
+    finder = _selected.get(grid)
+    if finder is None:
+        return PathFinder.for_grid(grid)
+    return finder
+
+
+def a_star(grid, start, end, AI):
+    """
+    Parameter AI is True if the function is called from the AI's moving algortihm.
+    This is important because the function has different return values with different values of 'AI':
+    the path length if AI is False, (list of squares from end to start, True) if AI is True.
+    """
+    path, cost = get_finder(grid).search(start.get_location(), end.get_location())
+
+    if not AI:
+        return cost
+
+    if path is None:
+        return None, False
 
+    return [grid.get_square(x, y) for x, y in reversed(path)], True
@@ -0,0 +1,79 @@
+
+
+class AttackMatrix():
+    """
+    The attacks one side can make right now: for every unit of side, the enemies it has in range and line of sight
+    together with the kill flag (World.can_kill) and score (World.best_attack) of attacking them.
+    Both phases of the AI's turn read from it, so every pair is checked once per turn.
+
+    The matrix remembers the walls and the unit versions of both sides it was built for (see World.units_changed).
+    When a unit moves through World.move_unit, only the row of that unit (or the column of that enemy) is recomputed.
+    Any other change, like an attack, a death or the end of a turn, makes is_valid() False
+    and the World builds a new matrix.
+    """
+
+    def __init__(self, world, side):
+        self.world = world
+        self.side = side
+        self.rows = {}  # unit: list of (enemy, kill flag, score) in the order of the enemy list
+        self.key = None
+        self.build()
+
+    def signature(self):
+        """
+        Returns the versions of the state the matrix depends on: the walls and the units of both sides
+        """
+        versions = self.world.unit_versions
+        return self.world.get_grid().obstacle_version, versions[0], versions[1]
+
+    def is_valid(self):
+        return self.key == self.signature()
+
+    def build(self):
+        self.rows = self.compute_rows(self.world.get_forces(self.side)[0])
+        self.key = self.signature()
+
+    def compute_rows(self, units):
+        """
+        Returns the rows of units: an entry for every enemy each can attack from its current square.
+        Line of sight is checked for all of them in one batch.
+        """
+        world = self.world
+        rows = {unit: [] for unit in units}
+        for unit, enemy in world.visible_enemies(units):
+            rows[unit].append((enemy, world.can_kill(unit, enemy), world.best_attack(unit, enemy)))
+        return rows
+
+    def unit_moved(self, unit):
+        """
+        Updates the matrix after unit has moved. Called by World.move_unit for a valid matrix.
+        """
+        world = self.world
+        if unit in self.rows:
+            self.rows.update(self.compute_rows([unit]))
+
+        else:  # An enemy moved: recompute its entry in every row
+            enemies = world.get_forces(self.side)[1]
+            x, y = unit.get_location()
+            attackers = []
+            for attacker, row in self.rows.items():
+                self.rows[attacker] = [entry for entry in row if entry[0] is not unit]
+                location = attacker.get_location()
+                if max(abs(location[0] - x), abs(location[1] - y)) <= attacker.get_range():
+                    attackers.append(attacker)
+
+            sights = world.line_of_sight_many([attacker.get_location() for attacker in attackers],
+                                              [(x, y)] * len(attackers))
+            for attacker, sight in zip(attackers, sights):
+                if sight:
+                    row = self.rows[attacker]
+                    row.append((unit, world.can_kill(attacker, unit), world.best_attack(attacker, unit)))
+                    row.sort(key=lambda entry: enemies.index(entry[0]))
+
+        self.key = self.signature()
+
+    def get_targets(self, unit):
+        """
+        Returns the (enemy, kill flag, score) entries of the enemies unit can attack, in the order of the enemy list
+        """
+        return self.rows.get(unit, [])
@@ -0,0 +1,242 @@
+import argparse
+import random
+import timeit
+import tracemalloc
+import a_star
+from hpa_star import HierarchicalPathFinder
+from grid import Grid
+from square import Square
+from player import Player
+from sniper import Sniper
+from commando import Commando
+from tank import Tank
+from ravager import Ravager
+from world import World
+
+"""
+Benchmarks for the data structures of the game, run from the command line.
+
+The memory benchmark measures the bytes allocated per unit and per square with tracemalloc.
+"Before" is the layout the game used to have: objects that keep their attributes in a __dict__,
+and a Square-object per cell holding its unit, wall flag and neighbour list.
+"After" is the current layout: units with __slots__, and a Grid whose cells are entries in flat arrays
+with Square-objects created only as temporary views.
+
+The landmarks benchmark runs the same A* searches on maps walled by World.add_obstacles with the Manhattan heuristic
+and with the landmark (ALT) heuristic, and compares the number of squares expanded and the time taken.
+
+The hierarchy benchmark runs the same searches with the A* PathFinder and with the HierarchicalPathFinder
+on a large map, and compares the time taken and the length of the paths found.
+
+Usage: python benchmark.py memory --count 10000
+       python benchmark.py landmarks --size 100 --walls 10 --landmarks 8
+       python benchmark.py hierarchy --size 1000 --cluster 16
+"""
+
+UNIT_TYPES = [Sniper, Commando, Tank, Ravager]
+
+
+class DictRecord():
+    """
+    An object that keeps its attributes in a __dict__, like the units and squares used to
+    """
+
+
+def dict_unit(unit):
+    """
+    Returns a DictRecord with the same attributes as unit, set in the same order as the unit's constructor does
+    """
+    record = DictRecord()
+    for cls in reversed(type(unit).__mro__):
+        for name in cls.__dict__.get("__slots__", ()):
+            setattr(record, name, getattr(unit, name))
+    record.attack_types = list(unit.attack_types)
+    return record
+
+
+def dict_grid(width, height):
+    """
+    Returns the squares of a map in the old layout: a list of columns of records with their neighbour lists
+    """
+    squares = []
+    for x in range(width):
+        column = []
+        for y in range(height):
+            square = DictRecord()
+            square.unit = None
+            square.obstacle = False
+            square.neighbours = []
+            square.x = x
+            square.y = y
+            column.append(square)
+        squares.append(column)
+
+    for x in range(width):
+        for y in range(height):
+            for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+                if 0 <= nx < width and 0 <= ny < height:
+                    squares[x][y].neighbours.append(squares[nx][ny])
+
+    return squares
+
+
+def measure(build):
+    """
+    Returns the number of bytes still allocated by the objects build() returns
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del objects
+    return size
+
+
+def memory_benchmark(count=10000, size=100):
+    """
+    Measures the memory of count units and of a size x size map, before and after.
+    :return: A dictionary of bytes per unit and bytes per square
+    """
+    owner = Player()
+
+    def slotted_units():
+        return [UNIT_TYPES[i % len(UNIT_TYPES)](owner) for i in range(count)]
+
+    def legacy_units():
+        return [dict_unit(UNIT_TYPES[i % len(UNIT_TYPES)](owner)) for i in range(count)]
+
+    def square_views():
+        grid = Grid(size, size)
+        return grid, [Square(x, y, grid) for x in range(size) for y in range(size)]
+
+    cells = size * size
+    return {
+        "unit_before": measure(legacy_units) / count,
+        "unit_after": measure(slotted_units) / count,
+        "square_before": measure(lambda: dict_grid(size, size)) / cells,
+        "square_after": measure(lambda: Grid(size, size)) / cells,
+        "square_view": (measure(square_views) - measure(lambda: Grid(size, size))) / cells,
+    }
+
+
+def landmark_benchmark(size=100, walls=10, landmarks=8, queries=200, seed=0):
+    """
+    Searches queries paths between random free squares of a size x size map, first with the Manhattan distance
+    and then with landmarks. add_obstacles() is called walls times to build the map.
+    Pairs of squares without a path between them are skipped, as both heuristics have to expand the whole area.
+    :return: A dictionary of the squares expanded and seconds taken by both heuristics, and the landmark setup time
+    """
+    random.seed(seed)
+    world = World(size, size)
+    for i in range(walls):
+        world.add_obstacles()
+
+    grid = world.get_grid()
+    free = [(x, y) for x in range(size) for y in range(size) if not grid.is_obstacle(x, y)]
+    finder = a_star.PathFinder.for_grid(grid)
+    finder.use_landmarks(0)
+    pairs = []
+    while len(pairs) < queries:
+        pair = (random.choice(free), random.choice(free))
+        if finder.search(pair[0], pair[1])[0] is not None:
+            pairs.append(pair)
+    result = {}
+
+    start = timeit.default_timer()
+    a_star.Landmarks.for_grid(grid, landmarks)
+    result["setup"] = timeit.default_timer() - start
+
+    for name, count in (("manhattan", 0), ("landmarks", landmarks)):
+        finder.use_landmarks(count)
+        expanded = 0
+        costs = []
+        start = timeit.default_timer()
+        for begin, end in pairs:
+            costs.append(finder.search(begin, end)[1])
+            expanded += finder.expanded
+        result[name + "_time"] = timeit.default_timer() - start
+        result[name + "_expanded"] = expanded
+        result[name + "_costs"] = costs
+
+    finder.use_landmarks(0)
+    if result["manhattan_costs"] != result["landmarks_costs"]:
+        raise AssertionError("The landmark heuristic found longer paths")
+    return result
+
+
+def hierarchy_benchmark(size=1000, walls=10, cluster=16, queries=50, seed=0):
+    """
+    Searches queries paths between random free squares of a size x size map with A* and with HPA*.
+    The hierarchical searches are run twice: first while the clusters are being built, then with all of them ready.
+    :return: A dictionary of the seconds taken and the total path length of both pathfinders
+    """
+    random.seed(seed)
+    world = World(size, size)
+    for i in range(walls):
+        world.add_obstacles()
+
+    grid = world.get_grid()
+    finder = a_star.PathFinder.for_grid(grid)
+    finder.use_landmarks(0)
+    hierarchy = HierarchicalPathFinder(world, cluster)
+    pairs = []
+    while len(pairs) < queries:
+        pair = ((random.randrange(size), random.randrange(size)), (random.randrange(size), random.randrange(size)))
+        if grid.is_free(*pair[0]) and grid.is_free(*pair[1]):
+            pairs.append(pair)
+
+    result = {}
+    for name, search in (("astar", finder.search), ("hpa_cold", hierarchy.search), ("hpa_warm", hierarchy.search)):
+        start = timeit.default_timer()
+        costs = [search(begin, end)[1] for begin, end in pairs]
+        result[name + "_time"] = timeit.default_timer() - start
+        result[name + "_length"] = sum(cost for cost in costs if cost != float("inf"))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the game's data structures.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    memory = subparsers.add_parser("memory", help="bytes per unit and per square")
+    memory.add_argument("--count", type=int, default=10000, help="number of units to create")
+    memory.add_argument("--size", type=int, default=100, help="width and height of the map")
+    landmarks = subparsers.add_parser("landmarks", help="squares expanded by A* with and without landmarks")
+    landmarks.add_argument("--size", type=int, default=100, help="width and height of the map")
+    landmarks.add_argument("--walls", type=int, default=10, help="number of times add_obstacles() is called")
+    landmarks.add_argument("--landmarks", type=int, default=8, help="number of landmarks")
+    landmarks.add_argument("--queries", type=int, default=200, help="number of searches")
+    landmarks.add_argument("--seed", type=int, default=0, help="seed of the map and the searches")
+    hierarchy = subparsers.add_parser("hierarchy", help="A* against hierarchical pathfinding on a large map")
+    hierarchy.add_argument("--size", type=int, default=1000, help="width and height of the map")
+    hierarchy.add_argument("--walls", type=int, default=10, help="number of times add_obstacles() is called")
+    hierarchy.add_argument("--cluster", type=int, default=16, help="width and height of a cluster")
+    hierarchy.add_argument("--queries", type=int, default=50, help="number of searches")
+    hierarchy.add_argument("--seed", type=int, default=0, help="seed of the map and the searches")
+    args = parser.parse_args(argv)
+
+    if args.benchmark == "memory":
+        result = memory_benchmark(args.count, args.size)
+        print("Unit: {:.0f} bytes before, {:.0f} bytes after".format(result["unit_before"], result["unit_after"]))
+        print("Square: {:.0f} bytes before, {:.1f} bytes after (+{:.0f} bytes per temporary Square view)".format(
+            result["square_before"], result["square_after"], result["square_view"]))
+
+    elif args.benchmark == "landmarks":
+        result = landmark_benchmark(args.size, args.walls, args.landmarks, args.queries, args.seed)
+        print("Landmarks: {:.3f} s to compute".format(result["setup"]))
+        for name in ("manhattan", "landmarks"):
+            print("{}: {} squares expanded, {:.3f} s".format(
+                name.capitalize(), result[name + "_expanded"], result[name + "_time"]))
+        print("Expanded squares: {:.1f}% fewer with landmarks".format(
+            100 * (1 - result["landmarks_expanded"] / max(1, result["manhattan_expanded"]))))
+
+    elif args.benchmark == "hierarchy":
+        result = hierarchy_benchmark(args.size, args.walls, args.cluster, args.queries, args.seed)
+        for name, label in (("astar", "A*"), ("hpa_cold", "HPA*, building clusters"), ("hpa_warm", "HPA*, clusters built")):
+            print("{}: {:.3f} s, paths {} steps in total".format(label, result[name + "_time"], result[name + "_length"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,3 @@
-import copy
 from unit import Unit
 from tank import Tank
 import random
@@ -12,6 +11,8 @@ class Commando(Unit):
     knife - effective against unarmoured targets (also applies a bleeding effect)
     """
 
+    __slots__ = ("bazooka_cd",)
+
     def __init__(self, owner):
         super().__init__(owner)
         self.owner = owner
@@ -127,23 +128,42 @@ class Commando(Unit):
         else:
             return 125 - enemy.get_armour()
 
-    def ai_attack(self, enemy):
+    def to_tuple(self):
+        return super().to_tuple() + (self.bazooka_cd,)
+
+    def from_tuple(self, state):
+        super().from_tuple(state)
+        self.bazooka_cd = state[5]
+
+    def attack_outcomes(self, attack_type, enemy):
         """
-        Determines which attack does most damage to 'enemy'
+        Returns every possible outcome of attack_type on 'enemy' (see Unit.attack_outcomes)
         """
-        attacks = []
+        armour = enemy.get_armour()
+
+        if attack_type == 1:
+            if type(enemy) is Tank:
+                return self.roll_outcomes(range(300, 351))
+            return self.roll_outcomes((roll // 4 for roll in range(300, 351)), 1 / 3) + [(2 / 3, 0, 0, False)]
+
+        elif attack_type == 2:
+            return self.roll_outcomes(roll - armour for roll in range(100, 151))
 
-        for attack in self.attack_types:
-            temp_enemy = copy.deepcopy(enemy)
-            temp_unit = copy.deepcopy(self)
-            if attack == 1 and self.bazooka_cd != 0:    # If bazooka is on cooldown, make sure it's not useable
-                attacks.append(-1)
-                continue
+        else:
+            if type(enemy) is Tank:
+                return [(1.0, 0, 0, False)]
+            return self.roll_outcomes((roll - armour for roll in range(200, 301)), 1 / 2, 4) + [(1 / 2, 0, 0, False)]
+
+    def damage_model(self, enemy):
+        """
+        Returns (attack type, expected damage, chance to hit, cooldown added) for every attack usable on 'enemy'
+        """
+        attacks = []
 
-            temp_unit.attack(temp_enemy, attack)
-            damage = enemy.get_hitpoints() - temp_enemy.get_hitpoints()
-            attacks.append(damage)
+        if self.bazooka_cd == 0:    # If bazooka is on cooldown, it's not useable
+            attacks.append(self.model_attack(1, enemy, 6))
 
-        attack = attacks.index(max(attacks)) + 1
+        attacks.append(self.model_attack(2, enemy, 0))
+        attacks.append(self.model_attack(3, enemy, 0))
 
-        self.attack(enemy, attack)
\ No newline at end of file
+        return attacks
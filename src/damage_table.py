@@ -0,0 +1,105 @@
+"""
+Exact damage distributions of every attack and kill-probability lookups built from them.
+
+A DamageTable describes one (attacker type, attack type, defender type, defender armour) combination.
+The tables are built from the attack_outcomes() of the attacking unit the first time a combination is needed
+and kept for the rest of the program, so asking for the chance to kill a unit is a couple of list lookups.
+
+Bleeding can be included as a horizon: the number of end-of-turn bleed ticks (5 damage each)
+the defender takes after the attack. Both the player's and the AI's turn end with a tick.
+"""
+
+import math
+
+BLEED_DAMAGE = 5
+
+_tables = {}  # (attacker type, attack type, defender type, defender armour): DamageTable
+
+
+class DamageTable():
+
+    def __init__(self, outcomes):
+        """
+        :param outcomes: A list of (probability, damage, bleed rounds, hit) tuples as returned by attack_outcomes()
+        """
+        self.distribution = {}  # damage: probability
+        groups = {}  # bleed rounds: {damage: probability}
+        hits = []
+
+        for probability, damage, rounds, hit in outcomes:
+            self.distribution[damage] = self.distribution.get(damage, 0.0) + probability
+            group = groups.setdefault(rounds, {})
+            group[damage] = group.get(damage, 0.0) + probability
+            if hit:
+                hits.append(probability)
+
+        self.hit_chance = math.fsum(hits)  # fsum keeps a certain hit at exactly 1.0
+
+        self.max_damage = max(self.distribution)
+
+        # For every number of bleed rounds the attack adds: tail[t] = P(damage >= t) within that group
+        self.groups = []
+        for rounds in sorted(groups):
+            tail = [0.0] * (self.max_damage + 2)
+            for damage, probability in groups[rounds].items():
+                tail[damage] += probability
+            for t in range(self.max_damage - 1, -1, -1):
+                tail[t] += tail[t + 1]
+            self.groups.append((rounds, tail))
+
+    def expected_damage(self, hitpoints):
+        """
+        Returns the average number of hitpoints a defender with 'hitpoints' left loses
+        """
+        return math.fsum(probability * min(damage, hitpoints) for damage, probability in self.distribution.items())
+
+    def kill_probability(self, hitpoints, bleed=0, horizon=0):
+        """
+        Returns the probability that the attack kills a defender with 'hitpoints' left.
+        :param bleed: The bleed rounds the defender already has
+        :param horizon: How many end-of-turn bleed ticks to include (0 counts only the attack itself)
+        """
+        if hitpoints <= 0:
+            return 1.0
+
+        probability = 0.0
+        for rounds, tail in self.groups:
+            pending = bleed + rounds if bleed < 3 else bleed  # The rule of Unit.apply_bleed_effect
+            needed = hitpoints - BLEED_DAMAGE * min(pending, horizon)
+            if needed <= 0:
+                probability += tail[0]
+            elif needed <= self.max_damage:
+                probability += tail[needed]
+
+        return probability
+
+
+def get_table(attacker, attack_type, defender):
+    """
+    Returns the DamageTable of attacker using attack_type on defender, building it on first use
+    """
+    key = (type(attacker), attack_type, type(defender), defender.get_armour())
+    table = _tables.get(key)
+    if table is None:
+        table = DamageTable(attacker.attack_outcomes(attack_type, defender))
+        _tables[key] = table
+    return table
+
+
+def precompute(unit_types, armour_boosts=(0, 20)):
+    """
+    Builds the tables of every unit type in unit_types against every unit type,
+    including defenders whose armour has been raised by the Ravager's roar.
+    Returns the number of tables built so far.
+    """
+    for attacker_type in unit_types:
+        attacker = attacker_type(None)
+        for defender_type in unit_types:
+            defender = defender_type(None)
+            base_armour = defender.get_armour()
+            for boost in armour_boosts:
+                defender.armour = base_armour + boost
+                for attack_type in attacker.get_attack_types():
+                    get_table(attacker, attack_type, defender)
+
+    return len(_tables)
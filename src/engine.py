@@ -0,0 +1,347 @@
+from zobrist import ZobristKeys
+
+"""
+The Engine class runs the game without any user interface. It owns the Game and World objects
+and applies every action through a plain API: placing units, moving, attacking, the AI's turn,
+ending a turn (bleeding, cooldowns and deaths) and checking the result.
+
+The GUI is one client of the Engine. Scripts and batch runs can play complete games
+without a QApplication.
+
+Searches use apply() and undo() instead of copying the World and the Game. An action is a tuple:
+("move", unit, x, y), ("attack", unit, enemy, attack type), ("ai_attack", unit, enemy) or ("end_turn",).
+apply() returns an undo record and undo() puts everything the action changed back: unit stats and locations,
+the units on the grid, units removed from the world, the turn flags and the turn counter.
+The random number generator is not part of the record.
+
+The Engine keeps a Zobrist hash of the state in self.hash (see zobrist.py). Every action updates it
+by rehashing only the units it touched, and undo() restores it from the record.
+"""
+
+
+class Engine():
+
+    def __init__(self, game, world):
+        self.game = game
+        self.world = world
+        self.game.set_world(world)
+        self.started = False
+        self.turns = 0  # Number of turns ended so far
+        self.keys = ZobristKeys()
+        self.hash = 0  # Zobrist hash of the state, kept up to date from start()
+
+    def get_game(self):
+        """
+        Returns the Game-object
+        """
+        return self.game
+
+    def get_world(self):
+        """
+        Returns the World-object
+        """
+        return self.world
+
+    def add_unit(self, unit):
+        """
+        Adds one of the player's units to the battlefield before the game starts.
+        Returns True if the unit was placed, False if the player already has the maximum number of units.
+        """
+        if self.started or len(self.world.get_player_units()) >= self.world.NO_UNITS_PER_PLAYER:
+            return False
+
+        self.world.add_unit_to_battlefield(unit)
+        return True
+
+    def start(self):
+        """
+        The AI picks its units and places them on the battlefield. After this the units can act.
+        """
+        self.world.reset_first_index()
+        self.game.counterpick_ai_units()
+        for unit in self.world.get_ai_units():
+            self.world.add_unit_to_battlefield(unit)
+
+        self.started = True
+        self.hash = self.compute_hash()
+
+    def move(self, unit, x, y):
+        """
+        Moves unit to the square in coordinates (x,y) if possible.
+        :return: A message describing the failure (empty on success) AND a boolean indicating whether the unit moved
+        """
+        if not self.started:
+            return "The game hasn't started yet!", False
+
+        if self.game.has_moved():
+            return "You have already moved a unit this turn!", False
+
+        if not self.world.get_square(x, y).is_free() or unit.get_owner() != self.game.whose_turn():
+            return "This tile is occupied! Try a different one!", False
+
+        if not self.world.can_move(unit, self.world.get_square(x, y)):
+            return "This unit can't move that far!", False
+
+        before = self.partial_hash([unit])
+        self.world.move_unit(unit, x, y)
+        self.game.move()  # Makes it so you can't move anymore this turn
+        self.hash ^= before ^ self.partial_hash([unit])
+        return "", True
+
+    def can_target(self, unit, enemy):
+        """
+        Checks that enemy is in unit's range and line of sight.
+        :return: The attack options of unit or the reason it can't attack AND a boolean indicating whether it can
+        """
+        unit_location = unit.get_location()
+        enemy_location = enemy.get_location()
+        x_diff = abs(unit_location[1] - enemy_location[1])
+        y_diff = abs(unit_location[0] - enemy_location[0])
+
+        if max(x_diff, y_diff) > unit.get_range():  # Check range
+            return "That unit is out of your range!", False
+
+        if not self.world.line_of_sight(unit_location, enemy_location):  # Check line of sight
+            return "You don't have line of sight!", False
+
+        return unit.attack_options(), True
+
+    def attack(self, unit, enemy, attack_type):
+        """
+        unit attacks enemy with the given attack type. A unit that dies is removed from the world.
+        :return: String describing the attack or the failure AND a boolean indicating whether the attack was made
+        """
+        if not self.started:
+            return "The game hasn't started yet!", False
+
+        if self.game.has_attacked():
+            return "You have already attacked this turn!", False
+
+        if unit.get_owner() != self.game.whose_turn():
+            return "It's not this unit's turn!", False
+
+        message, status = self.can_target(unit, enemy)
+        if not status:
+            return message, False
+
+        before = self.partial_hash([unit, enemy])
+        message, status = unit.attack(enemy, attack_type)
+        if status:
+            self.game.attack()  # Upon a successful attack, count it
+            self.world.units_changed()
+            self.remove_if_dead(enemy)
+            self.hash ^= before ^ self.partial_hash([unit, enemy])
+
+        return message, status
+
+    def ai_turn(self):
+        """
+        The AI moves one unit and attacks with one unit for the side whose turn it is.
+        The player's side can be played by the AI too, which is used for self-play.
+        Does not end the turn.
+        :return: (the unit that moved, the unit that attacked, the unit that was attacked), None for actions not taken
+        """
+        side = self.current_side()
+        moved = None
+        unit, square = self.world.get_best_move(side)
+
+        if unit is not None:
+            x, y = square.get_location()
+            message, status = self.move(unit, x, y)
+            if status:
+                moved = unit
+
+        unit, enemy = self.world.ai_attack(side)
+
+        if unit is not None and enemy is not None and self.ai_attack(unit, enemy):
+            return moved, unit, enemy
+
+        return moved, None, None
+
+    def legal_actions(self):
+        """
+        Returns every action (see the module docstring) the side whose turn it is can apply right now:
+        moves of any unit to any square it can reach, every usable attack on every enemy it can target,
+        and ending the turn.
+        """
+        units, enemies = self.world.get_forces(self.current_side())
+        actions = []
+
+        if not self.game.has_moved():
+            for unit in units:
+                for x, y in self.world.get_reachable(unit):
+                    actions.append(("move", unit, x, y))
+
+        if not self.game.has_attacked():
+            for unit, enemy in self.world.visible_enemies(units):
+                for attack in unit.damage_model(enemy):  # The attacks that are off cooldown
+                    actions.append(("attack", unit, enemy, attack[0]))
+
+        actions.append(("end_turn",))
+        return actions
+
+    def current_side(self):
+        """
+        Returns 0 if it is the player's turn and 1 if it is the AI's
+        """
+        if self.game.whose_turn() is self.game.get_player():
+            return 0
+        return 1
+
+    def end_turn(self):
+        """
+        Ends the current turn. Every bleeding unit takes bleeding damage, cooldowns are reduced
+        and units that die are removed from the world.
+        :return: A list of the units that died
+        """
+        units = list(self.world.get_player_units()) + list(self.world.get_ai_units())
+        before = self.partial_hash(units)
+        self.game.end_turn()
+        dead = []
+
+        for unit in units:
+            unit.take_bleeding_damage()
+            unit.reduce_attack_cd()  # Reduces bazooka cd if unit is a commando or a tank, otherwise does nothing
+
+            if self.remove_if_dead(unit):
+                dead.append(unit)
+
+        self.world.units_changed()
+        self.turns += 1
+        self.hash ^= before ^ self.partial_hash(units)
+        return dead
+
+    def remove_if_dead(self, unit):
+        """
+        Removes unit from the world if it has died. Returns True if it was removed.
+        """
+        if unit.is_alive():
+            return False
+
+        if unit in self.world.get_player_units():
+            self.world.remove_unit(unit, 0)
+        elif unit in self.world.get_ai_units():
+            self.world.remove_unit(unit, 1)
+        else:
+            return False
+
+        return True
+
+    def apply(self, action):
+        """
+        Applies an action (see the module docstring) with the same rules as the GUI.
+        :return: An undo record for undo(), or None if the action wasn't allowed (nothing changed)
+        """
+        kind = action[0]
+
+        if kind == "end_turn":
+            units = list(self.world.get_player_units()) + list(self.world.get_ai_units())
+        elif kind == "move":
+            units = [action[1]]
+        else:
+            units = [action[1], action[2]]
+
+        record = (action, list(self.game.turn), self.game.current_turn, self.turns, self.hash,
+                  [(unit, unit.to_tuple()) for unit in units], self.positions(units))
+
+        if kind == "move":
+            status = self.move(action[1], action[2], action[3])[1]
+        elif kind == "attack":
+            status = self.attack(action[1], action[2], action[3])[1]
+        elif kind == "ai_attack":
+            status = self.ai_attack(action[1], action[2])
+        elif kind == "end_turn":
+            self.end_turn()
+            status = True
+        else:
+            raise ValueError("Unknown action: {}".format(kind))
+
+        if not status:
+            return None
+        return record
+
+    def undo(self, record):
+        """
+        Restores the state from before the action of record was applied.
+        Records must be undone in the reverse order they were applied in.
+        """
+        action, turn, current_turn, turns, state_hash, states, positions = record
+        world = self.world
+
+        for unit, state in states:
+            location = state[4]
+            if unit.is_alive() and unit.get_location() != location:
+                world.move_unit(unit, location[0], location[1])
+            unit.from_tuple(state)
+
+        for side, position, unit, sequence in positions:  # In list order, so every unit goes back to its index
+            if unit not in world.get_forces(side)[0]:
+                world.restore_unit(unit, side, position, sequence)
+        world.units_changed()
+
+        self.game.turn = turn
+        self.game.current_turn = current_turn
+        self.turns = turns
+        self.hash = state_hash
+
+    def positions(self, units):
+        """
+        Returns where each of units is kept in the world, as (side, index in the unit list, unit, index sequence)
+        tuples sorted by side and index. Used to put removed units back in place.
+        """
+        positions = []
+        for side in (0, 1):
+            forces = self.world.get_forces(side)[0]
+            index = self.world.get_unit_index(side)
+            for position, unit in enumerate(forces):
+                if unit in units:
+                    positions.append((side, position, unit, index.get_sequence(unit)))
+        return positions
+
+    def ai_attack(self, unit, enemy):
+        """
+        unit attacks enemy with the attack the AI would choose. Returns True if the attack was made.
+        """
+        if self.game.has_attacked() or unit.get_owner() != self.game.whose_turn():
+            return False
+
+        if not self.can_target(unit, enemy)[1]:
+            return False
+
+        before = self.partial_hash([unit, enemy])
+        unit.ai_attack(enemy)
+        self.game.attack()
+        self.world.units_changed()
+        self.remove_if_dead(enemy)
+        self.hash ^= before ^ self.partial_hash([unit, enemy])
+        return True
+
+    def partial_hash(self, units):
+        """
+        Returns the part of the state hash that covers units and the turn
+        """
+        value = self.keys.turn_hash(self.game)
+        for unit in units:
+            value ^= self.keys.unit_hash(unit)
+        return value
+
+    def compute_hash(self):
+        """
+        Returns the Zobrist hash of the current state computed from scratch
+        """
+        return self.keys.state_hash(self.game, self.world)
+
+    def result(self):
+        """
+        Returns the winner (the Player or AI object) once one side has no units left, otherwise None.
+        """
+        if not self.started:
+            return None
+
+        if len(self.world.get_ai_units()) == 0:
+            return self.game.get_player()
+
+        if len(self.world.get_player_units()) == 0:
+            return self.game.get_ai()
+
+        return None
@@ -0,0 +1,234 @@
+from array import array
+import weakref
+from square import Square
+
+"""
+The Grid class is the storage behind the game world. Instead of one Square-object per cell,
+every layer of the map is kept in a flat array indexed by x * height + y:
+
+obstacles - bytearray, 1 if the cell is a wall
+occupied - bytearray, 1 if a unit stands in the cell
+unit_ids - array of ints, the id of the unit in the cell (0 if empty)
+neighbour_masks - bytearray, one bit for each free neighbour of the cell (LEFT, DOWN, RIGHT, UP)
+
+Square-objects are created on demand as thin views over these layers.
+Every change to the grid increments version, so caches built from the grid can tell when they are stale.
+Caches that only depend on the walls can use obstacle_version instead.
+Caches that want to know which cell changed can register a listener, a method called with (x,y) after every change.
+The grid only keeps a weak reference to the listener, so a registered cache can still be freed.
+The neighbour masks are kept up to date incrementally: a change to one cell only refreshes the masks
+of its four neighbours. rebuild_neighbours() recalculates every mask and is used to validate the incremental updates.
+"""
+
+OFFSETS_X = (0, 1, 0, -1)  # LEFT, DOWN, RIGHT, UP
+OFFSETS_Y = (-1, 0, 1, 0)
+
+
+class Grid():
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        size = width * height
+
+        self.obstacles = bytearray(size)
+        self.occupied = bytearray(size)
+        self.unit_ids = array("i", [0]) * size
+        self.neighbour_masks = bytearray(size)
+
+        self.units = [None]  # Unit-objects by id. Id 0 is reserved for empty cells
+        self.free_ids = []  # Ids of removed units that can be reused
+        self.version = 0  # Incremented on every change to obstacles or units
+        self.obstacle_version = 0  # Incremented when a wall is added
+        self.listeners = []  # Weak references to methods called with (x, y) after the cell (x,y) has changed
+
+        self.rebuild_neighbours()
+
+    def index(self, x, y):
+        """
+        Returns the flat index of the cell (x,y)
+        """
+        return x * self.height + y
+
+    def location(self, index):
+        """
+        Returns the (x,y) coordinates of a flat index
+        """
+        return divmod(index, self.height)
+
+    def in_bounds(self, x, y):
+        """
+        Returns True if (x,y) is inside the grid
+        """
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get_square(self, x, y):
+        """
+        Returns a Square-object viewing the cell (x,y)
+        """
+        return Square(x, y, self)
+
+    def is_obstacle(self, x, y):
+        return self.obstacles[x * self.height + y] == 1
+
+    def is_free(self, x, y):
+        """
+        Returns True if the cell is neither a wall nor occupied by a unit
+        """
+        index = x * self.height + y
+        return not self.obstacles[index] and not self.occupied[index]
+
+    def get_unit(self, x, y):
+        """
+        Returns the unit standing in (x,y) or None if the cell is empty
+        """
+        return self.units[self.unit_ids[x * self.height + y]]
+
+    def set_obstacle(self, x, y):
+        self.obstacles[x * self.height + y] = 1
+        self.version += 1
+        self.obstacle_version += 1
+        self.refresh_around(x, y)
+
+    def place_unit(self, x, y, unit):
+        """
+        Stores unit in the cell (x,y). A unit already in the cell is replaced.
+        """
+        index = x * self.height + y
+        if self.occupied[index]:
+            self.clear_unit(x, y)
+
+        if self.free_ids:
+            unit_id = self.free_ids.pop()
+            self.units[unit_id] = unit
+        else:
+            unit_id = len(self.units)
+            self.units.append(unit)
+
+        self.unit_ids[index] = unit_id
+        self.occupied[index] = 1
+        self.version += 1
+        self.refresh_around(x, y)
+
+    def clear_unit(self, x, y):
+        """
+        Empties the cell (x,y)
+        """
+        index = x * self.height + y
+        unit_id = self.unit_ids[index]
+        if unit_id != 0:
+            self.units[unit_id] = None
+            self.free_ids.append(unit_id)
+
+        self.unit_ids[index] = 0
+        self.occupied[index] = 0
+        self.version += 1
+        self.refresh_around(x, y)
+
+    def update_neighbours(self, x, y):
+        """
+        Recalculates the neighbour mask of the cell (x,y).
+        Bit i is set if the neighbour in direction i (LEFT, DOWN, RIGHT, UP) is free.
+        """
+        width = self.width
+        height = self.height
+        obstacles = self.obstacles
+        occupied = self.occupied
+        mask = 0
+
+        for i in range(4):
+            nx = x + OFFSETS_X[i]
+            ny = y + OFFSETS_Y[i]
+            if nx < 0 or nx > width - 1 or ny < 0 or ny > height - 1:
+                continue
+            index = nx * height + ny
+            if obstacles[index] or occupied[index]:
+                continue
+            mask |= 1 << i
+
+        self.neighbour_masks[x * height + y] = mask
+
+    def refresh_around(self, x, y):
+        """
+        Updates the neighbour masks of the four neighbours of (x,y) after the cell has changed.
+        The mask of (x,y) itself only depends on its neighbours, so it is left as it is.
+        The listeners are told about the change afterwards.
+        """
+        width = self.width
+        height = self.height
+        masks = self.neighbour_masks
+        index = x * height + y
+        free = not self.obstacles[index] and not self.occupied[index]
+
+        for i in range(4):
+            nx = x + OFFSETS_X[i]
+            ny = y + OFFSETS_Y[i]
+            if nx < 0 or nx > width - 1 or ny < 0 or ny > height - 1:
+                continue
+            bit = 1 << ((i + 2) % 4)  # The direction from the neighbour back to (x,y)
+            if free:
+                masks[nx * height + ny] |= bit
+            else:
+                masks[nx * height + ny] &= ~bit
+
+        dead = False
+        for reference in self.listeners:
+            listener = reference()
+            if listener is None:
+                dead = True
+            else:
+                listener(x, y)
+        if dead:  # The object of a listener has been freed
+            self.listeners = [reference for reference in self.listeners if reference() is not None]
+
+    def add_listener(self, listener):
+        """
+        Makes the grid call listener(x, y) every time a wall is added or a unit enters or leaves the cell (x,y).
+        listener is a bound method. It is held through a weak reference and dropped once its object is freed.
+        """
+        self.listeners.append(weakref.WeakMethod(listener))
+
+    def remove_listener(self, listener):
+        """
+        Stops calling a listener registered with add_listener
+        """
+        self.listeners = [reference for reference in self.listeners if reference() not in (None, listener)]
+
+    def rebuild_neighbours(self):
+        """
+        Recalculates the neighbour mask of every cell in the grid
+        """
+        for x in range(self.width):
+            for y in range(self.height):
+                self.update_neighbours(x, y)
+
+    def neighbours_consistent(self):
+        """
+        Returns True if the incrementally maintained neighbour masks match a full rebuild.
+        The masks are left unchanged.
+        """
+        masks = self.neighbour_masks[:]
+        self.rebuild_neighbours()
+        rebuilt = self.neighbour_masks
+        self.neighbour_masks = masks
+        return masks == rebuilt
+
+    def get_neighbours(self, x, y):
+        """
+        Returns the coordinates of the free neighbours of (x,y) as a list of tuples
+        in the order LEFT, DOWN, RIGHT, UP.
+        """
+        mask = self.neighbour_masks[x * self.height + y]
+        neighbours = []
+        for i in range(4):
+            if mask & (1 << i):
+                neighbours.append((x + OFFSETS_X[i], y + OFFSETS_Y[i]))
+
+        return neighbours
+
+    def __iter__(self):
+        """
+        Iterates over the columns of the grid as lists of Square-objects, like the old 2D list did
+        """
+        for x in range(self.width):
+            yield [Square(x, y, self) for y in range(self.height)]
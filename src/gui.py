@@ -5,7 +5,7 @@ from commando import Commando
 from tank import Tank
 from ravager import Ravager
 from square_graphics_item import SquareGraphicsItem
-import a_star
+from engine import Engine
 import sys
 import timeit
 
@@ -14,6 +14,7 @@ class GUI(QtWidgets.QMainWindow):
     """
     GUI is a class that enables the drawing
     of the game world and interacting with it.
+    The game rules are applied by an Engine-object, the GUI only draws its state and forwards the user's actions.
     """
 
     def __init__(self, game, world, square_size):
@@ -22,6 +23,7 @@ class GUI(QtWidgets.QMainWindow):
         self.vertical = QtWidgets.QVBoxLayout()  # Vertical main layout
 
         self.centralWidget().setLayout(self.vertical)
+        self.engine = Engine(game, world)
         self.game = game
         self.world = world
         self.square_size = square_size
@@ -105,8 +107,7 @@ class GUI(QtWidgets.QMainWindow):
         Creates a UnitGraphicsItem for the unit and adds it to the scene
         :param unit: Unit-object
         """
-        if len(self.player_units_graphics_items) < 5:
-            self.world.add_unit_to_battlefield(unit)
+        if self.engine.add_unit(unit):
             item = UnitGraphicsItem(unit, self.square_size, 0, self)
             self.scene.addItem(item)
             self.player_units_graphics_items.append(item)
@@ -115,16 +116,13 @@ class GUI(QtWidgets.QMainWindow):
         """
         Adds ai units and creates a UnitGraphicsItem for each of them
         """
-        self.world.reset_first_index()
-        self.game.counterpick_ai_units()
+        self.engine.start()
         for unit in self.world.get_ai_units():
-            self.world.add_unit_to_battlefield(unit)
             item = UnitGraphicsItem(unit, self.square_size, 1, self)  # 1 means the owner is the AI
             self.scene.addItem(item)
             self.ai_units_graphics_items.append(item)
 
         self.remove_starting_buttons()  # Removes buttons that add units
-        self.world.update_square_neighbours()  # Update square neighbours now that all units have been added
 
         self.started = True  # Units can be now interacted with
 
@@ -141,29 +139,11 @@ class GUI(QtWidgets.QMainWindow):
     def end_current_turn(self, player):
         """
         Resets movement and attack counters and unselects currently selected unit.
-        Loops over all units and reduces their hp by 5 if they are bleeding. Removes units that die from bleed.
+        The engine applies bleeding damage and cooldowns. Units that die are removed from the scene.
         Parameter 'player' is True if the player's turn just ended and False if the AI's turn did.
         """
-        self.game.end_turn()
-        for item in self.player_units_graphics_items:
-            unit = item.get_unit()
-            unit.take_bleeding_damage()
-            unit.reduce_attack_cd()  # Reduces bazooka cd if unit is a commando or a tank, otherwise does nothing
-
-            if not unit.is_alive():
-                self.world.remove_unit(unit, 0)
-                self.player_units_graphics_items.remove(item)
-                self.scene.removeItem(item)
-
-        for item in self.ai_units_graphics_items:
-            unit = item.get_unit()
-            unit.take_bleeding_damage()
-            unit.reduce_attack_cd()
-
-            if not unit.is_alive():
-                self.world.remove_unit(unit, 1)
-                self.ai_units_graphics_items.remove(item)
-                self.scene.removeItem(item)
+        self.engine.end_turn()
+        self.remove_dead_units()
 
         self.reset_selected_units()
         self.game_over()  # Checks if game is over
@@ -171,6 +151,25 @@ class GUI(QtWidgets.QMainWindow):
         if player:
             self.ai_turn()  # AI plays its turn
 
+    def remove_dead_units(self):
+        """
+        Removes the UnitGraphicsItems of units that have died from the scene
+        """
+        for items in (self.player_units_graphics_items, self.ai_units_graphics_items):
+            for item in list(items):
+                if not item.get_unit().is_alive():
+                    items.remove(item)
+                    self.scene.removeItem(item)
+
+    def get_graphics_item(self, unit):
+        """
+        Returns the UnitGraphicsItem drawing unit
+        """
+        for item in self.player_units_graphics_items + self.ai_units_graphics_items:
+            if item.get_unit() == unit:
+                return item
+        return None
+
     def print_attack_options(self):
         """
         Prints the attack options of every unique unit on the battlefield
@@ -216,29 +215,15 @@ class GUI(QtWidgets.QMainWindow):
         """
         Moves currently_selected unit to square in coordinates (x,y) if possible.
         """
+        message, status = self.engine.move(unit, x, y)
 
-        if self.world.get_square(x, y).is_free() and unit.get_owner() == self.game.whose_turn():
-            current_location = unit.get_location()  # Unit's current location (x,y) tuple
-
-            if a_star.a_star(self.world.get_grid(), self.world.get_square(current_location[0], current_location[1]),
-                             self.world.get_square(x, y), False) <= unit.get_speed():
-                self.world.get_square(current_location[0], current_location[1]).remove_unit_from_square()
-                self.world.get_square(x, y).add_unit_to_square(unit)
-                unit.update_location(x, y)
-                self.currently_selected.update_position()
-
-                self.world.update_square_neighbours()
-                self.game.move()  # Makes it so you can't move anymore this turn
-
-                self.reset_selected_units()
-
-                self.statusBar.showMessage("", 1)
-
-            else:
-                self.statusBar.showMessage("This unit can't move that far!")
+        if status:
+            self.get_graphics_item(unit).update_position()
+            self.reset_selected_units()
+            self.statusBar.showMessage("", 1)
 
         else:
-            self.statusBar.showMessage("This tile is occupied! Try a different one!")
+            self.statusBar.showMessage(message)
 
     def attack(self, p_unit, e_unit):
         """
@@ -249,22 +234,14 @@ class GUI(QtWidgets.QMainWindow):
         Prints attack options of p_unit onto the status bar.
         Attacking is then performed via keyPressEvent
         """
-        player_location = p_unit.get_unit().get_location()  # coordinates of attacking unit
-        enemy_location = e_unit.get_unit().get_location()  # coordinates of defending unit
-        x_diff = abs(player_location[1] - enemy_location[1])
-        y_diff = abs(player_location[0] - enemy_location[0])
-
-        if max(x_diff, y_diff) <= p_unit.get_unit().get_range():  # Check range
-
-            if not self.world.line_of_sight(player_location, enemy_location):  # Check line of sight
-                self.statusBar.showMessage("You don't have line of sight!", 1000)
+        message, status = self.engine.can_target(p_unit.get_unit(), e_unit.get_unit())  # Check range and line of sight
 
-            else:
-                self.defender = e_unit
-                self.statusBar.showMessage(p_unit.get_unit().attack_options())
+        if status:
+            self.defender = e_unit
+            self.statusBar.showMessage(message)
 
         else:
-            self.statusBar.showMessage("That unit is out of your range!", 1000)
+            self.statusBar.showMessage(message, 1000)
 
     def keyPressEvent(self, key):
         """
@@ -272,29 +249,17 @@ class GUI(QtWidgets.QMainWindow):
         """
         status = False  # False if a nonexistent attack option was chosen
         message = ""  # Attack summary (str)
+        attack_keys = {QtCore.Qt.Key_1: 1, QtCore.Qt.Key_2: 2, QtCore.Qt.Key_3: 3}
 
         if self.currently_selected is not None and self.defender is not None:
 
-            if key.key() == QtCore.Qt.Key_1:
-                message, status = self.currently_selected.get_unit().attack(self.defender.get_unit(), 1)
-
-            elif key.key() == QtCore.Qt.Key_2:
-                message, status = self.currently_selected.get_unit().attack(self.defender.get_unit(), 2)
-
-            elif key.key() == QtCore.Qt.Key_3:
-                message, status = self.currently_selected.get_unit().attack(self.defender.get_unit(), 3)
+            if key.key() in attack_keys:
+                message, status = self.engine.attack(self.currently_selected.get_unit(), self.defender.get_unit(),
+                                                     attack_keys[key.key()])
 
+            self.statusBar.showMessage(message, 10000)  # Attack summary or failure message
             if status:
-                self.statusBar.showMessage(message, 10000)  # Attack summary
-                self.game.attack()  # Upon a successful attack, count it
-
-                if not self.defender.get_unit().is_alive():
-                    self.world.remove_unit(self.defender.get_unit(), 1)
-                    self.ai_units_graphics_items.remove(self.defender)
-                    self.scene.removeItem(self.defender)
-
-            else:
-                self.statusBar.showMessage(message, 10000)  # Failure message
+                self.remove_dead_units()
 
             self.reset_selected_units()
 
@@ -302,33 +267,21 @@ class GUI(QtWidgets.QMainWindow):
         """
         A method for the AI's turn
         """
-        unit, square = self.world.get_best_move()
+        moved, unit, enemy = self.engine.ai_turn()
 
-        if unit is not None:
-            for unit_item in self.ai_units_graphics_items:
-                if unit_item.get_unit() == unit:
-                    self.currently_selected = unit_item
-            x, y = square.get_location()
-            self.move_unit(x, y, unit)
-
-        unit, enemy = self.world.ai_attack()
+        if moved is not None:
+            self.get_graphics_item(moved).update_position()
 
         if unit is not None and enemy is not None:
-            unit.ai_attack(enemy)
             self.statusBar.showMessage("An enemy {} attacked your {}, leaving it with {} HP".format(unit.get_name(), enemy.get_name(), enemy.get_hitpoints()), 10000)
-            for enemy_item in self.ai_units_graphics_items:
-                if enemy_item.get_unit() == enemy:
-                    self.defender = enemy_item
-
-                    if not self.defender.get_unit().is_alive():
-                        self.world.remove_unit(self.defender.get_unit(), 1)
-                        self.ai_units_graphics_items.remove(self.defender)
-                        self.scene.removeItem(self.defender)
+            self.remove_dead_units()
 
         self.end_current_turn(False)
 
     def game_over(self):
-        if len(self.ai_units_graphics_items) == 0:
+        winner = self.engine.result()
+
+        if winner is self.game.get_player():
             print("You won!")
             print("The game lasted {} minutes and {} seconds.".format(
                 int((timeit.default_timer() - self.starting_time) // 60),
@@ -336,7 +289,7 @@ class GUI(QtWidgets.QMainWindow):
             sys.exit()
 
 
-        elif len(self.player_units_graphics_items) == 0:
+        elif winner is self.game.get_ai():
             print("You lost!")
             print("The game lasted {} minutes and {} seconds.".format(
                 int((timeit.default_timer() - self.starting_time) // 60),
@@ -0,0 +1,319 @@
+from heapq import heappush, heappop
+import weakref
+
+"""
+The HierarchicalPathFinder class finds paths on very large grids with HPA* (hierarchical path-finding A*).
+
+The grid is split into square clusters. Where two neighbouring clusters have free squares side by side on their
+common border, the pair is an entrance: one in the middle of every short opening and one at each end of a long one.
+The entrances of a cluster are the nodes of an abstract graph. A node is linked to the node across its entrance
+at cost 1 and to the other nodes of its cluster at the length of the shortest path inside the cluster.
+
+A search connects start and end to the nodes of their clusters, finds the route with A* on the small abstract graph
+and then refines it into squares with short searches inside one cluster at a time.
+The paths are close to the shortest ones but not always the shortest.
+
+Clusters are built lazily the first time a search reaches them. The finder listens to the grid,
+and when a unit moves or dies or a wall is added, only the clusters around that square are built again.
+The finder and the grid only hold weak references to each other, so either can be freed while the other is in use.
+detach() stops the listening for good, and a_star.select() calls it when the finder is replaced.
+"""
+
+ENTRANCE_SPLIT = 6  # Openings at least this wide get an entrance at both ends instead of one in the middle
+
+
+class HierarchicalPathFinder():
+
+    def __init__(self, world, cluster_size=16):
+        """
+        :param world: The World whose grid is searched
+        :param cluster_size: Width and height of a cluster in squares
+        """
+        grid = world.get_grid()
+        self.grid_ref = weakref.ref(grid)
+        self.size = cluster_size
+        self.clusters_x = (grid.width + cluster_size - 1) // cluster_size
+        self.clusters_y = (grid.height + cluster_size - 1) // cluster_size
+        self.borders = {}  # (cluster, cluster to the right or below): list of entrances as (square, square) pairs
+        self.graphs = {}  # cluster: {node: list of (neighbouring node, cost)}
+        self.expanded = 0  # Number of abstract nodes expanded by the latest search
+        grid.add_listener(self.square_changed)
+
+    @property
+    def grid(self):
+        return self.grid_ref()
+
+    def detach(self):
+        """
+        Stops following the changes to the grid. The finder must not be used afterwards, as its clusters go stale.
+        """
+        grid = self.grid
+        if grid is not None:
+            grid.remove_listener(self.square_changed)
+
+    def cluster_of(self, index):
+        """
+        Returns the cluster of the square with flat index index
+        """
+        x, y = divmod(index, self.grid.height)
+        return (x // self.size) * self.clusters_y + y // self.size
+
+    def bounds(self, cluster):
+        """
+        Returns the squares of cluster as (first x, last x + 1, first y, last y + 1)
+        """
+        cx, cy = divmod(cluster, self.clusters_y)
+        x0 = cx * self.size
+        y0 = cy * self.size
+        return x0, min(x0 + self.size, self.grid.width), y0, min(y0 + self.size, self.grid.height)
+
+    def square_changed(self, x, y):
+        """
+        Called by the grid after the square (x,y) has changed. Forgets the cluster of the square
+        and, if the square is on a border, the entrances of that border and the cluster on the other side.
+        """
+        height = self.grid.height
+        cluster = self.cluster_of(x * height + y)
+        self.graphs.pop(cluster, None)
+
+        for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+            if 0 <= nx < self.grid.width and 0 <= ny < height:
+                other = self.cluster_of(nx * height + ny)
+                if other != cluster:
+                    self.borders.pop((min(cluster, other), max(cluster, other)), None)
+                    self.graphs.pop(other, None)
+
+    def is_free(self, index):
+        return not self.grid.obstacles[index] and not self.grid.occupied[index]
+
+    def get_border(self, cluster, other):
+        """
+        Returns the entrances between cluster and other, which is the next cluster to the right or below.
+        Every entrance is a (square in cluster, square in other) pair of flat indices.
+        """
+        key = (cluster, other)
+        entrances = self.borders.get(key)
+        if entrances is not None:
+            return entrances
+
+        height = self.grid.height
+        x0, x1, y0, y1 = self.bounds(cluster)
+        if other == cluster + 1:  # Other is below: the border runs along x between y1 - 1 and y1
+            pairs = [(x * height + y1 - 1, x * height + y1) for x in range(x0, x1)]
+        else:  # Other is to the right: the border runs along y between x1 - 1 and x1
+            pairs = [((x1 - 1) * height + y, x1 * height + y) for y in range(y0, y1)]
+
+        entrances = []
+        opening = []
+        for pair in pairs + [None]:
+            if pair is not None and self.is_free(pair[0]) and self.is_free(pair[1]):
+                opening.append(pair)
+                continue
+            if len(opening) >= ENTRANCE_SPLIT:
+                entrances.append(opening[0])
+                entrances.append(opening[-1])
+            elif opening:
+                entrances.append(opening[len(opening) // 2])
+            opening = []
+
+        self.borders[key] = entrances
+        return entrances
+
+    def get_graph(self, cluster):
+        """
+        Returns the abstract graph of cluster: its nodes with the costs to the other nodes of the cluster
+        and to the nodes across its entrances
+        """
+        graph = self.graphs.get(cluster)
+        if graph is not None:
+            return graph
+
+        cx, cy = divmod(cluster, self.clusters_y)
+        graph = {}
+        links = []  # (node in cluster, node across the border)
+        if cy > 0:
+            links += [(b, a) for a, b in self.get_border(cluster - 1, cluster)]
+        if cy < self.clusters_y - 1:
+            links += self.get_border(cluster, cluster + 1)
+        if cx > 0:
+            links += [(b, a) for a, b in self.get_border(cluster - self.clusters_y, cluster)]
+        if cx < self.clusters_x - 1:
+            links += self.get_border(cluster, cluster + self.clusters_y)
+
+        for node, across in links:
+            graph.setdefault(node, []).append((across, 1))
+        for node in graph:
+            distances = self.local_search(node, cluster)[0]
+            for other in graph:
+                if other != node and other in distances:
+                    graph[node].append((other, distances[other]))
+
+        self.graphs[cluster] = graph
+        return graph
+
+    def local_search(self, start, cluster, goal=None):
+        """
+        A breadth-first search from the flat index start over the free squares of cluster.
+        Stops early when goal is reached.
+        :return: (dictionary of distances from start, dictionary of the square each square was reached from)
+        """
+        grid = self.grid
+        height = grid.height
+        masks = grid.neighbour_masks
+        steps = (-1, height, 1, -height)  # LEFT, DOWN, RIGHT, UP as index offsets
+        x0, x1, y0, y1 = self.bounds(cluster)
+
+        distances = {start: 0}
+        parents = {start: None}
+        layer = [start]
+        distance = 0
+        while layer and goal not in distances:
+            distance += 1
+            next_layer = []
+            for current in layer:
+                mask = masks[current]
+                for i in range(4):
+                    if not mask & (1 << i):
+                        continue
+                    neighbour = current + steps[i]
+                    if neighbour in distances:
+                        continue
+                    x, y = divmod(neighbour, height)
+                    if x0 <= x < x1 and y0 <= y < y1:
+                        distances[neighbour] = distance
+                        parents[neighbour] = current
+                        next_layer.append(neighbour)
+            layer = next_layer
+
+        return distances, parents
+
+    def search(self, start, end):
+        """
+        Finds a short path between two squares, like PathFinder.search.
+        start and end are tuples of (x,y) coordinates.
+
+        Returns the path as a list of (x,y) tuples from start to end and its length in steps.
+        If end can't be reached, returns (None, float("inf")).
+        """
+        height = self.grid.height
+        start_index = start[0] * height + start[1]
+        end_index = end[0] * height + end[1]
+        end_x, end_y = end
+        end_cluster = self.cluster_of(end_index)
+        self.expanded = 0
+
+        if start_index == end_index:
+            return [start], 0
+        if not self.is_free(end_index):
+            return None, float("inf")
+
+        end_distances, end_parents = self.local_search(end_index, end_cluster)
+        end_graph = self.get_graph(end_cluster)
+
+        # The searches out of start: one inside its cluster, and one from each free neighbour in another cluster,
+        # as a unit standing on a border is not an entrance itself
+        seeds = [(start_index, 0)]
+        masks = self.grid.neighbour_masks
+        for i, step in enumerate((-1, height, 1, -height)):
+            neighbour = start_index + step
+            if masks[start_index] & (1 << i) and self.cluster_of(neighbour) != self.cluster_of(start_index):
+                seeds.append((neighbour, 1))
+
+        # A* on the abstract graph. end_index stands for the goal, reached from the nodes of its cluster
+        # or, inside one cluster, directly from a search out of start.
+        g_score = {}
+        last_visited = {}
+        start_parents = {}  # seed: the squares the search from seed reached each square from
+        frontier = []
+        count = 0
+        for seed, offset in seeds:
+            distances, start_parents[seed] = self.local_search(seed, self.cluster_of(seed))
+            if seed != start_index:
+                last_visited[seed] = start_index
+            targets = [node for node in self.get_graph(self.cluster_of(seed)) if node in distances]
+            if end_index in distances:
+                targets.append(end_index)
+
+            for node in targets:
+                score = offset + distances[node]
+                if node not in g_score or score < g_score[node]:
+                    g_score[node] = score
+                    if node != seed:
+                        last_visited[node] = seed
+                    x, y = divmod(node, height)
+                    count += 1
+                    heappush(frontier, (score + abs(x - end_x) + abs(y - end_y), count, node, score))
+
+        while frontier:
+            entry = heappop(frontier)
+            current = entry[2]
+            if entry[3] != g_score[current]:  # A shorter way to current was found after this entry was pushed
+                continue
+            if current == end_index:
+                return self.refine(start_index, end_index, last_visited, start_parents, end_parents)
+
+            self.expanded += 1
+            edges = self.get_graph(self.cluster_of(current))[current]
+            if current in end_graph and current in end_distances:
+                edges = edges + [(end_index, end_distances[current])]
+
+            for neighbour, cost in edges:
+                temp_g_score = g_score[current] + cost
+                if neighbour not in g_score or temp_g_score < g_score[neighbour]:
+                    g_score[neighbour] = temp_g_score
+                    last_visited[neighbour] = current
+                    x, y = divmod(neighbour, height)
+                    count += 1
+                    heappush(frontier, (temp_g_score + abs(x - end_x) + abs(y - end_y), count, neighbour, temp_g_score))
+
+        return None, float("inf")
+
+    def refine(self, start_index, end_index, last_visited, start_parents, end_parents):
+        """
+        Turns the abstract route found by search() into squares.
+        Returns the path as a list of (x,y) tuples from start to end and its length in steps.
+        """
+        route = [end_index]
+        while route[-1] != start_index:
+            route.append(last_visited[route[-1]])
+        route.reverse()
+
+        squares = [start_index]
+        for current, following in zip(route, route[1:]):
+            if current in start_parents and following in start_parents[current]:  # Along a search out of start
+                segment = self.walk(start_parents[current], following)
+                segment.reverse()
+                squares.extend(segment[1:])
+            elif following == end_index and current in end_parents:  # Along the search from end, backwards
+                squares.extend(self.walk(end_parents, current)[1:])
+            elif self.cluster_of(following) != self.cluster_of(current):  # Across an entrance
+                squares.append(following)
+            else:
+                parents = self.local_search(current, self.cluster_of(current), following)[1]
+                segment = self.walk(parents, following)
+                segment.reverse()
+                squares.extend(segment[1:])
+
+        height = self.grid.height
+        path = [divmod(index, height) for index in squares]
+        return path, len(path) - 1
+
+    @staticmethod
+    def walk(parents, index):
+        """
+        Returns the flat indices from index back to the start of a local search
+        """
+        squares = [index]
+        while parents[squares[-1]] is not None:
+            squares.append(parents[squares[-1]])
+        return squares
+
+    def first_reachable(self, start, goals):
+        """
+        Returns the first goal in the list that can be reached from start, or None if none of them can,
+        like PathFinder.first_reachable
+        """
+        for goal in goals:
+            if self.search(start, goal)[0] is not None:
+                return goal
+        return None
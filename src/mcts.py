@@ -0,0 +1,247 @@
+import math
+import random
+import timeit
+
+"""
+The MCTS class plays a side's turn with Monte Carlo Tree Search over single actions:
+the moves, attacks and turn ends listed by Engine.legal_actions().
+
+The tree is open loop: a node stands for a sequence of actions rather than a state, and every iteration
+replays the sequence from the root with Engine.apply(), rolling the attacks anew. The randomness of the attacks
+is thereby sampled instead of ignored, and an action that the rolls made impossible just ends the descent.
+Nodes are widened progressively: the number of children grows with the square root of the visits,
+and actions are expanded in order of a heuristic priority, so a large number of moves doesn't spread the search thin.
+Each iteration finishes with a short playout by the greedy heuristics of World.get_best_move and World.ai_attack,
+scores the result and undoes everything. The random generator is restored after the search.
+"""
+
+
+class Node():
+    __slots__ = ("action", "parent", "side", "children", "untried", "visits", "value")
+
+    def __init__(self, action, parent, side):
+        self.action = action
+        self.parent = parent
+        self.side = side  # The side that plays action
+        self.children = []
+        self.untried = None  # Actions not expanded yet, filled on the first visit
+        self.visits = 0
+        self.value = 0.0  # Sum of rewards for side
+
+
+class MCTS():
+    UNIT_VALUE = 200  # Worth of a living unit on top of its hitpoints
+    EXPLORATION = 0.3
+    WIDENING = 2  # A node may have WIDENING * sqrt(visits + 1) children
+    REWARD_SCALE = 200  # A gain of this much worth gives a reward of about 0.88
+
+    def __init__(self, engine, budget=0.1, iterations=None, playout_turns=2):
+        """
+        :param engine: The Engine of the game
+        :param budget: Seconds the AI may think per turn, None for no time limit
+        :param iterations: Maximum number of iterations per turn, None for no limit
+        :param playout_turns: Number of greedy turns in each playout
+        """
+        self.engine = engine
+        self.world = engine.get_world()
+        self.budget = budget
+        self.iterations = iterations
+        self.playout_turns = playout_turns
+        self.root = None
+        self.rollouts = 0  # Iterations run during the latest turn
+        self.root_balance = 0  # balance() of the searching side at the root
+
+    def choose_actions(self):
+        """
+        Searches the turn of the side whose turn it is.
+        :return: A list of the actions to play this turn, see Engine.apply. The end of the turn is not included.
+        """
+        side = self.engine.current_side()
+        self.root = Node(None, None, 1 - side)
+        self.rollouts = 0
+        self.root_balance = self.balance(side)
+        deadline = None if self.budget is None else timeit.default_timer() + self.budget
+        random_state = random.getstate()
+
+        try:
+            while self.iterations is None or self.rollouts < self.iterations:
+                if deadline is not None and timeit.default_timer() > deadline:
+                    break
+                self.iterate(side)
+                self.rollouts += 1
+        finally:
+            random.setstate(random_state)
+
+        actions = []
+        node = self.root
+        while node.children:
+            node = max(node.children, key=lambda child: child.visits)
+            if node.side != side or node.action[0] == "end_turn":
+                break
+            actions.append(node.action)
+        return actions
+
+    def play_turn(self):
+        """
+        Plays the actions found by choose_actions(). Does not end the turn.
+        :return: (the unit that moved, the unit that attacked, the unit that was attacked) like Engine.ai_turn
+        """
+        moved = None
+        attacker = None
+        target = None
+
+        for action in self.choose_actions():
+            if action[0] == "move":
+                if self.engine.move(action[1], action[2], action[3])[1]:
+                    moved = action[1]
+            elif self.engine.attack(action[1], action[2], action[3])[1]:
+                attacker = action[1]
+                target = action[2]
+
+        if moved is None and not self.engine.game.has_moved():  # No move was chosen: move like the greedy AI
+            unit, square = self.world.get_best_move(self.engine.current_side())
+            if unit is not None and self.engine.move(unit, square.get_location()[0], square.get_location()[1])[1]:
+                moved = unit
+
+        if attacker is None:  # The search may not have looked past the move: attack like the greedy AI
+            unit, enemy = self.world.ai_attack(self.engine.current_side())
+            if unit is not None and self.engine.ai_attack(unit, enemy):
+                attacker = unit
+                target = enemy
+
+        return moved, attacker, target
+
+    def iterate(self, side):
+        """
+        One iteration: selection and expansion from the root, a playout, and backpropagation of the reward
+        """
+        engine = self.engine
+        node = self.root
+        path = [node]
+        records = []
+
+        try:
+            while engine.result() is None:
+                if node.untried is None:
+                    node.untried = self.ordered_actions()
+
+                if node.untried and len(node.children) < self.WIDENING * math.sqrt(node.visits + 1):
+                    # Expand the next untried action
+                    mover = engine.current_side()
+                    action = node.untried.pop()
+                    record = engine.apply(action)
+                    if record is None:
+                        continue
+                    records.append(record)
+                    child = Node(action, node, mover)
+                    node.children.append(child)
+                    path.append(child)
+                    break
+
+                if not node.children:
+                    break
+                child = self.select(node)
+                record = engine.apply(child.action)
+                if record is None:  # The rolls of this iteration made the action impossible
+                    break
+                records.append(record)
+                node = child
+                path.append(node)
+
+            reward = self.playout(side, records)
+        finally:
+            for record in reversed(records):
+                engine.undo(record)
+
+        for node in path:
+            node.visits += 1
+            node.value += reward if node.side == side else 1.0 - reward
+
+    def select(self, node):
+        """
+        Returns the child of node with the highest upper confidence bound (UCT)
+        """
+        log_visits = math.log(node.visits)
+        best = None
+        best_bound = -1.0
+        for child in node.children:
+            bound = child.value / child.visits + self.EXPLORATION * math.sqrt(log_visits / child.visits)
+            if bound > best_bound:
+                best_bound = bound
+                best = child
+        return best
+
+    def ordered_actions(self):
+        """
+        Returns the legal actions in the order they are expanded in (from the end of the list):
+        attacks first, then the greedy move, then moves to squares the unit can attack from,
+        the other moves and the end of the turn last
+        """
+        actions = self.engine.legal_actions()
+        unit, square = self.world.get_best_move(self.engine.current_side())
+        greedy = None if unit is None else ("move", unit) + square.get_location()
+
+        def priority(action):
+            if action[0] == "attack":
+                return 4
+            if action == greedy:
+                return 3
+            if action[0] == "move":
+                if self.world.can_attack_from_square(action[1], self.world.get_square(action[2], action[3])):
+                    return 2
+                return 1
+            return 0
+
+        actions.sort(key=priority)
+        return actions
+
+    def playout(self, side, records):
+        """
+        Plays greedy turns from the current state, adding their undo records to records.
+        Returns the reward of the resulting state for side, between 0 and 1.
+        """
+        engine = self.engine
+        world = self.world
+
+        for turn in range(self.playout_turns):
+            if engine.result() is not None:
+                break
+
+            current = engine.current_side()
+            if not engine.game.has_moved():
+                unit, square = world.get_best_move(current)
+                if unit is not None:
+                    record = engine.apply(("move", unit) + square.get_location())
+                    if record is not None:
+                        records.append(record)
+
+            if not engine.game.has_attacked():
+                unit, enemy = world.ai_attack(current)
+                if unit is not None:
+                    record = engine.apply(("ai_attack", unit, enemy))
+                    if record is not None:
+                        records.append(record)
+
+            records.append(engine.apply(("end_turn",)))
+
+        return self.reward(side)
+
+    def reward(self, side):
+        """
+        Returns the reward of the current state for side, between 0 and 1: 1 for a win, 0 for a loss
+        and otherwise how much side gained on the enemy since the root, squashed with tanh
+        """
+        units, enemies = self.world.get_forces(side)
+        if not enemies:
+            return 1.0
+        if not units:
+            return 0.0
+        return 0.5 + 0.5 * math.tanh((self.balance(side) - self.root_balance) / self.REWARD_SCALE)
+
+    def balance(self, side):
+        """
+        Returns the worth of side's living units minus the worth of the enemy's
+        """
+        units, enemies = self.world.get_forces(side)
+        return sum(self.UNIT_VALUE + unit.get_hitpoints() for unit in units) - \
+            sum(self.UNIT_VALUE + enemy.get_hitpoints() for enemy in enemies)
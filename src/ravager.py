@@ -1,4 +1,3 @@
-import copy
 from unit import Unit
 import random
 
@@ -9,6 +8,8 @@ class Ravager(Unit):
     It can deal devastating damage to any type of unit but it has to get up close.
     """
 
+    __slots__ = ("armour_boost",)
+
     def __init__(self, owner):
         super().__init__(owner)
         self.owner = owner
@@ -68,20 +69,29 @@ class Ravager(Unit):
         """
         return 200
 
-    def ai_attack(self, enemy):
+    def to_tuple(self):
+        return super().to_tuple() + (self.armour_boost,)
+
+    def from_tuple(self, state):
+        super().from_tuple(state)
+        self.armour_boost = state[5]
+
+    def attack_outcomes(self, attack_type, enemy):
         """
-        Determines which attack does most damage to 'enemy'
+        Returns every possible outcome of attack_type on 'enemy' (see Unit.attack_outcomes).
+        Roar does no damage, it only increases the Ravager's own armour.
         """
-        attacks = []
+        if attack_type == 1:
+            return self.roll_outcomes(range(100, 301))
+        return [(1.0, 0, 0, True)]
 
-        for attack in self.attack_types:
-            temp_enemy = copy.deepcopy(enemy)
-            temp_unit = copy.deepcopy(self)
-
-            temp_unit.attack(temp_enemy, attack)
-            damage = enemy.get_hitpoints() - temp_enemy.get_hitpoints()
-            attacks.append(damage)
+    def damage_model(self, enemy):
+        """
+        Returns (attack type, expected damage, chance to hit, cooldown added) for every attack usable on 'enemy'.
+        """
+        attacks = [self.model_attack(1, enemy, 0)]
 
-        attack = attacks.index(max(attacks)) + 1
+        if not self.armour_boost:
+            attacks.append(self.model_attack(2, enemy, 0))
 
-        self.attack(enemy, attack)
+        return attacks
@@ -0,0 +1,319 @@
+import random
+import timeit
+from zobrist import TranspositionTable
+
+"""
+The AnytimeAI class plays a side's turn with a game tree search under a wall-clock budget.
+
+A turn is a move (or none) followed by an attack (or none) and the end of the turn. The search looks at
+such turns for both sides in alternation with alpha-beta negamax, deepening one turn at a time
+until the budget runs out. The result of the deepest finished search is played, so the AI always has an answer,
+and a faster computer simply reaches deeper.
+
+States are explored with Engine.apply() and Engine.undo(), and results are shared between
+move orders that reach the same state through a TranspositionTable keyed by the Engine's Zobrist hash.
+Attack rolls inside the search are determinized: the random generator is seeded from the state hash
+before every attack, and its state is restored when the search ends so the game's own rolls are unaffected.
+"""
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the time budget has run out
+    """
+
+
+class AnytimeAI():
+    UNIT_VALUE = 200  # Worth of a living unit on top of its hitpoints
+    BLEED_VALUE = 5  # Hitpoints a round of bleeding will take
+    WIN_SCORE = 1000000
+
+    def __init__(self, engine, budget=0.1, max_depth=8, moves_per_unit=3, table=None):
+        """
+        :param engine: The Engine of the game
+        :param budget: Seconds the AI may think per turn
+        :param max_depth: Deepest search in turns
+        :param moves_per_unit: How many squares to consider for each unit besides moving closer
+        :param table: A TranspositionTable shared between turns. A new one is made if not given.
+        """
+        self.engine = engine
+        self.world = engine.get_world()
+        self.budget = budget
+        self.max_depth = max_depth
+        self.moves_per_unit = moves_per_unit
+        self.table = table if table is not None else TranspositionTable()
+
+        self.deadline = 0
+        self.nodes = 0  # Nodes searched during the latest turn
+        self.depth = 0  # Depth of the deepest finished search during the latest turn
+
+    def choose_turn(self):
+        """
+        Searches for the best turn of the side whose turn it is.
+        :return: (move action or None, attack action or None), see Engine.apply
+        """
+        self.deadline = timeit.default_timer() + self.budget
+        self.nodes = 0
+        self.depth = 0
+        self.table.new_search()
+        random_state = random.getstate()
+
+        side = self.engine.current_side()
+        best = None
+
+        try:
+            for depth in range(1, self.max_depth + 1):
+                try:
+                    turn, score, complete = self.search_root(side, depth, best)
+                except SearchTimeout:
+                    break
+
+                if turn is not None and (complete or best is None):
+                    best = turn
+                    self.depth = depth if complete else depth - 1
+                if not complete or abs(score) >= self.WIN_SCORE:
+                    break
+        finally:
+            random.setstate(random_state)
+
+        if best is None:  # Not even one turn was searched: step the first unit that can towards the enemy
+            for unit in self.world.get_forces(side)[0]:
+                move = self.step_closer(unit)
+                if move is not None:
+                    return move, None
+            return None, None
+
+        return best
+
+    def play_turn(self):
+        """
+        Plays the turn found by choose_turn(). Does not end the turn.
+        :return: (the unit that moved, the unit that attacked, the unit that was attacked) like Engine.ai_turn
+        """
+        move, attack = self.choose_turn()
+        moved = None
+
+        if move is not None and self.engine.move(move[1], move[2], move[3])[1]:
+            moved = move[1]
+
+        if attack is None:  # The greedy attack after the move, as the search may not have reached it
+            unit, enemy = self.world.ai_attack(self.engine.current_side())
+            attack = None if unit is None else ("ai_attack", unit, enemy)
+
+        if attack is not None and self.engine.ai_attack(attack[1], attack[2]):
+            return moved, attack[1], attack[2]
+
+        return moved, None, None
+
+    def search_root(self, side, depth, previous):
+        """
+        Searches every candidate turn to depth turns.
+        :return: The best turn, its score and whether every candidate was searched before the time ran out
+        """
+        best = None
+        best_score = -self.WIN_SCORE * 2
+        alpha = -self.WIN_SCORE * 2
+        beta = self.WIN_SCORE * 2
+
+        turns = self.candidate_turns(side)
+        if previous in turns:  # The best turn of the previous depth is searched first
+            turns.remove(previous)
+            turns.insert(0, previous)
+
+        for turn in turns:
+            try:
+                score = self.play_and_search(turn, depth, alpha, beta)
+            except SearchTimeout:
+                if depth == 1 and best is not None:  # Every finished turn of the first depth is a real result
+                    return best, best_score, False
+                raise
+
+            if score > best_score:
+                best_score = score
+                best = turn
+            alpha = max(alpha, score)
+
+        self.table.store(self.engine.hash, depth, best_score, best)
+        return best, best_score, True
+
+    def negamax(self, depth, alpha, beta):
+        """
+        Returns the score of the current state for the side whose turn it is, searching depth turns ahead
+        """
+        self.nodes += 1
+        if timeit.default_timer() > self.deadline:
+            raise SearchTimeout()
+
+        engine = self.engine
+        side = engine.current_side()
+        if depth == 0 or engine.result() is not None:
+            return self.evaluate(side)
+
+        key = engine.hash
+        original_alpha = alpha
+        previous = None
+        entry = self.table.lookup(key)
+        if entry is not None:
+            previous = entry[4]
+            if entry[1] >= depth:
+                if entry[5] == TranspositionTable.EXACT:
+                    return entry[3]
+                if entry[5] == TranspositionTable.LOWER:
+                    alpha = max(alpha, entry[3])
+                else:
+                    beta = min(beta, entry[3])
+                if alpha >= beta:
+                    return entry[3]
+
+        turns = self.candidate_turns(side)
+        if previous in turns:
+            turns.remove(previous)
+            turns.insert(0, previous)
+
+        best = None
+        best_score = -self.WIN_SCORE * 2
+        for turn in turns:
+            score = self.play_and_search(turn, depth, alpha, beta)
+            if score > best_score:
+                best_score = score
+                best = turn
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            flag = TranspositionTable.UPPER
+        elif best_score >= beta:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        self.table.store(key, depth, best_score, best, flag)
+        return best_score
+
+    def play_and_search(self, turn, depth, alpha, beta):
+        """
+        Plays turn and the end of the turn, searches the opponent's reply and undoes everything.
+        Returns the score of turn for the side that plays it.
+        """
+        engine = self.engine
+        records = []
+        try:
+            for action in turn:
+                if action is None:
+                    continue
+                if action[0] != "move":
+                    random.seed(engine.hash)  # The same state always rolls the same damage
+                record = engine.apply(action)
+                if record is not None:
+                    records.append(record)
+
+            if engine.result() is not None:  # The game ended during the turn
+                return self.evaluate(engine.current_side())
+
+            records.append(engine.apply(("end_turn",)))
+            return -self.negamax(depth - 1, -beta, -alpha)
+        finally:
+            for record in reversed(records):
+                engine.undo(record)
+
+    def candidate_turns(self, side):
+        """
+        Returns the turns worth searching for side: every attack available after each candidate move.
+        Turns that attack come first. A turn without an attack is only searched if no attack is possible.
+        """
+        engine = self.engine
+        turns = []
+
+        for move in self.candidate_moves(side):
+            if timeit.default_timer() > self.deadline:
+                raise SearchTimeout()
+            record = engine.apply(move) if move is not None else None
+            if move is not None and record is None:
+                continue
+
+            attacks = self.candidate_attacks(side)
+            for attack in attacks:
+                turns.append((move, attack))
+            if not attacks:
+                turns.append((move, None))
+
+            if record is not None:
+                engine.undo(record)
+
+        turns.sort(key=lambda turn: turn[1] is None)
+        return turns
+
+    def candidate_moves(self, side):
+        """
+        Returns the moves worth searching for side: not moving, each unit's step towards the closest enemy,
+        and for each unit the first few squares from which it could attack.
+        Only the squares each unit can reach this turn are looked at, so the cost doesn't grow with the map.
+        """
+        moves = [None]
+        if self.engine.game.has_moved():
+            return moves
+
+        units = self.world.get_forces(side)[0]
+        for unit in units:
+            if timeit.default_timer() > self.deadline:
+                raise SearchTimeout()
+            move = self.step_closer(unit)
+            if move is not None:
+                moves.append(move)
+
+            count = 0
+            for x, y in self.world.get_reachable(unit):
+                if count >= self.moves_per_unit:
+                    break
+                move = ("move", unit, x, y)
+                if move not in moves and self.world.can_attack_from_square(unit, self.world.get_square(x, y)):
+                    moves.append(move)
+                    count += 1
+
+        return moves
+
+    def step_closer(self, unit):
+        """
+        Returns the move of unit to the square it can reach this turn that is closest to the nearest enemy
+        by Manhattan distance, or None if it can't get any closer
+        """
+        x, y = unit.get_location()
+        enemy, distance = self.world.get_enemy_index(unit).nearest(x, y)
+        if enemy is None:
+            return None
+
+        ex, ey = enemy.get_location()
+        best = None
+        for sx, sy in self.world.get_reachable(unit):
+            if abs(sx - ex) + abs(sy - ey) < distance:
+                distance = abs(sx - ex) + abs(sy - ey)
+                best = ("move", unit, sx, sy)
+        return best
+
+    def candidate_attacks(self, side):
+        """
+        Returns an AI attack on every enemy each unit of side can target right now
+        """
+        if self.engine.game.has_attacked():
+            return []
+
+        units = self.world.get_forces(side)[0]
+        return [("ai_attack", unit, enemy) for unit, enemy in self.world.visible_enemies(units)]
+
+    def evaluate(self, side):
+        """
+        Returns the value of the current state for side: its units' worth minus the enemy's.
+        A won game is worth WIN_SCORE.
+        """
+        units, enemies = self.world.get_forces(side)
+        if not enemies:
+            return self.WIN_SCORE
+        if not units:
+            return -self.WIN_SCORE
+
+        score = 0
+        for unit in units:
+            score += self.UNIT_VALUE + unit.get_hitpoints() - self.BLEED_VALUE * unit.bleed
+        for enemy in enemies:
+            score -= self.UNIT_VALUE + enemy.get_hitpoints() - self.BLEED_VALUE * enemy.bleed
+        return score
@@ -0,0 +1,172 @@
+import argparse
+import random
+import sys
+import timeit
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from engine import Engine
+from search_ai import AnytimeAI
+from mcts import MCTS
+from game import Game
+from world import World
+from sniper import Sniper
+from commando import Commando
+from tank import Tank
+from ravager import Ravager
+
+"""
+A command-line runner that plays AI-vs-AI matches without a GUI, spread over all cores with a process pool.
+The player's side is played by the same AI as the AI's side. Every match gets its own seed and map size,
+the player's roster is drawn at random from the seed and the AI counter-picks it as usual.
+With --budget the AI's side searches its turns instead, with the AnytimeAI or with MCTS (--ai mcts),
+to compare it against the greedy AI.
+
+Results are printed as the matches finish and summarised at the end with win rates per side and per unit type,
+turn counts and the number of games played per second. Used for balancing the unit stats.
+
+Usage: python selfplay.py --games 1000 --sizes 10 15 20
+"""
+
+UNIT_TYPES = [Sniper, Commando, Tank, Ravager]
+
+
+SEARCH_AIS = {"search": AnytimeAI, "mcts": MCTS}
+
+
+def play_match(seed, size, max_turns, budget=None, ai="search"):
+    """
+    Plays one AI-vs-AI match.
+    :param seed: Seed for the random number generator (map, rosters and attack rolls)
+    :param size: Width and height of the map
+    :param max_turns: The match is a draw if neither side has won after this many turns
+    :param budget: If given, the AI's side is played by a searching AI with this many seconds per turn
+    :param ai: The searching AI, a key of SEARCH_AIS
+    :return: A dictionary describing the match
+    """
+    start_time = timeit.default_timer()
+    random.seed(seed)
+
+    game = Game()
+    world = World(size, size)
+    world.reset_first_index()
+    world.add_obstacles()
+    engine = Engine(game, world)
+
+    for i in range(World.NO_UNITS_PER_PLAYER):
+        engine.add_unit(random.choice(UNIT_TYPES)(game.get_player()))
+    player_roster = [unit.get_name() for unit in world.get_player_units()]
+
+    engine.start()
+    ai_roster = [unit.get_name() for unit in world.get_ai_units()]
+    search = SEARCH_AIS[ai](engine, budget) if budget is not None else None
+
+    while engine.result() is None and engine.turns < max_turns:
+        if search is not None and engine.current_side() == 1:
+            search.play_turn()
+        else:
+            engine.ai_turn()
+        engine.end_turn()
+
+    winner = engine.result()
+    if winner is game.get_player():
+        winner = "player"
+    elif winner is game.get_ai():
+        winner = "ai"
+
+    return {
+        "seed": seed,
+        "size": size,
+        "player_roster": player_roster,
+        "ai_roster": ai_roster,
+        "winner": winner,
+        "turns": engine.turns,
+        "seconds": timeit.default_timer() - start_time,
+    }
+
+
+def run_matches(games, sizes, seed=0, max_turns=200, workers=None, budget=None, ai="search"):
+    """
+    Plays games matches in a process pool and yields their results as they finish.
+    Match i uses the seed seed + i and the map size sizes[i % len(sizes)].
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_match, seed + i, sizes[i % len(sizes)], max_turns, budget, ai)
+                   for i in range(games)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+class Summary():
+    """
+    Collects match results into win rates, turn counts and throughput
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.wins = {"player": 0, "ai": 0, None: 0}  # None counts draws
+        self.turns = 0
+        self.unit_games = {}  # Unit name: number of rosters the unit appeared in
+        self.unit_wins = {}  # Unit name: number of those rosters that won
+        self.start_time = timeit.default_timer()
+
+    def add(self, result):
+        self.games += 1
+        self.wins[result["winner"]] += 1
+        self.turns += result["turns"]
+
+        for side in ("player", "ai"):
+            for name in set(result[side + "_roster"]):  # A unit picked twice still counts as one roster
+                self.unit_games[name] = self.unit_games.get(name, 0) + 1
+                if result["winner"] == side:
+                    self.unit_wins[name] = self.unit_wins.get(name, 0) + 1
+
+    def games_per_second(self):
+        elapsed = timeit.default_timer() - self.start_time
+        return self.games / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        """
+        Returns the summary as a string
+        """
+        if self.games == 0:
+            return "No games played"
+
+        lines = ["Games: {} | {:.1f} games/sec".format(self.games, self.games_per_second()),
+                 "Player wins: {:.1%} | AI wins: {:.1%} | Draws: {:.1%}".format(
+                     self.wins["player"] / self.games, self.wins["ai"] / self.games, self.wins[None] / self.games),
+                 "Average turns: {:.1f}".format(self.turns / self.games)]
+
+        for name in sorted(self.unit_games):
+            lines.append("{}: win rate {:.1%} over {} rosters".format(
+                name, self.unit_wins.get(name, 0) / self.unit_games[name], self.unit_games[name]))
+
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plays AI-vs-AI matches in parallel and reports win rates.")
+    parser.add_argument("--games", type=int, default=100, help="number of matches to play")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10], help="map sizes, used in turn")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first match")
+    parser.add_argument("--max-turns", type=int, default=200, help="turns before a match is declared a draw")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all cores)")
+    parser.add_argument("--budget", type=float, default=None, help="seconds per turn for a searching AI side")
+    parser.add_argument("--ai", choices=sorted(SEARCH_AIS), default="search", help="the searching AI for --budget")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    args = parser.parse_args(argv)
+
+    if min(args.sizes) < World.NO_UNITS_PER_PLAYER:
+        parser.error("map sizes must be at least {}".format(World.NO_UNITS_PER_PLAYER))
+
+    summary = Summary()
+    for result in run_matches(args.games, args.sizes, args.seed, args.max_turns, args.workers, args.budget, args.ai):
+        summary.add(result)
+        if not args.quiet:
+            print("seed {} | size {} | winner {} | turns {} | {:.3f} s".format(
+                result["seed"], result["size"], result["winner"], result["turns"], result["seconds"]))
+            sys.stdout.flush()
+
+    print(summary.report())
+
+
+if __name__ == '__main__':
+    main()
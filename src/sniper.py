@@ -1,10 +1,10 @@
-import copy
-
 from unit import Unit
 import random
 
 class Sniper(Unit):
 
+    __slots__ = ()
+
     def __init__(self, owner):
         """
         The sniper unit has low hp and low armour.
@@ -56,21 +56,15 @@ class Sniper(Unit):
         """
         return (100 - enemy.get_armour()) + 10
 
-    def ai_attack(self, enemy):
+    def attack_outcomes(self, attack_type, enemy):
         """
-        Determines which attack does most damage to 'enemy'
+        Returns every possible outcome of attack_type on 'enemy' (see Unit.attack_outcomes)
         """
-        attacks = []
-
-        for attack in self.attack_types:
-            temp_enemy = copy.deepcopy(enemy)
-            temp_unit = copy.deepcopy(self)
-
-            temp_unit.attack(temp_enemy, attack)
-            damage = enemy.get_hitpoints() - temp_enemy.get_hitpoints()
-            attacks.append(damage)
-
-        attack = attacks.index(max(attacks)) + 1
-
-        self.attack(enemy, attack)
+        armour = enemy.get_armour()
+        return self.roll_outcomes((roll - armour for roll in range(90, 111)), bleed=2)
 
+    def damage_model(self, enemy):
+        """
+        Returns (attack type, expected damage, chance to hit, cooldown added) for every attack usable on 'enemy'
+        """
+        return [self.model_attack(1, enemy, 0)]
@@ -0,0 +1,130 @@
+
+
+class SpatialIndex():
+    """
+    A uniform bucket grid of units. The map is divided into blocks of block x block squares
+    and every unit is kept in the bucket of the block it stands in, so a range query
+    only looks at the buckets that overlap the range instead of every unit.
+
+    Every unit gets a sequence number when it is inserted. Queries return units in that order,
+    which is the order of the World's unit lists, so ties are broken the same way as a scan of the list.
+    """
+
+    def __init__(self, width, height, block=8):
+        self.width = width
+        self.height = height
+        self.block = block
+        self.blocks_x = (width + block - 1) // block
+        self.blocks_y = (height + block - 1) // block
+        self.buckets = [[] for i in range(self.blocks_x * self.blocks_y)]  # Lists of (sequence, unit)
+        self.entries = {}  # unit: (x, y, sequence)
+        self.sequence = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def bucket(self, x, y):
+        """
+        Returns the bucket of the block that contains the square (x,y)
+        """
+        return self.buckets[(x // self.block) * self.blocks_y + y // self.block]
+
+    def clear(self):
+        for bucket in self.buckets:
+            bucket.clear()
+        self.entries.clear()
+        self.sequence = 0
+
+    def insert(self, unit, x, y, sequence=None):
+        """
+        Adds unit standing in the square (x,y). It is ordered after every unit already in the index,
+        unless the sequence number it had before it was removed is given.
+        """
+        if sequence is None:
+            self.sequence += 1
+            sequence = self.sequence
+        self.entries[unit] = (x, y, sequence)
+        self.bucket(x, y).append((sequence, unit))
+
+    def get_sequence(self, unit):
+        """
+        Returns the sequence number of unit, or None if it isn't in the index
+        """
+        entry = self.entries.get(unit)
+        if entry is None:
+            return None
+        return entry[2]
+
+    def remove(self, unit):
+        """
+        Removes unit from the index. Does nothing if it isn't there.
+        """
+        entry = self.entries.pop(unit, None)
+        if entry is not None:
+            x, y, sequence = entry
+            self.bucket(x, y).remove((sequence, unit))
+
+    def move(self, unit, x, y):
+        """
+        Moves unit to the square (x,y), keeping its place in the order
+        """
+        old_x, old_y, sequence = self.entries[unit]
+        self.entries[unit] = (x, y, sequence)
+        old_bucket = self.bucket(old_x, old_y)
+        new_bucket = self.bucket(x, y)
+        if old_bucket is not new_bucket:
+            old_bucket.remove((sequence, unit))
+            new_bucket.append((sequence, unit))
+
+    def within(self, x, y, radius):
+        """
+        Returns the units within Chebyshev distance radius of the square (x,y), in insertion order
+        """
+        block = self.block
+        found = []
+
+        for bx in range(max(0, (x - radius) // block), min(self.blocks_x - 1, (x + radius) // block) + 1):
+            row = bx * self.blocks_y
+            for by in range(max(0, (y - radius) // block), min(self.blocks_y - 1, (y + radius) // block) + 1):
+                for sequence, unit in self.buckets[row + by]:
+                    ux, uy = self.entries[unit][:2]
+                    if abs(ux - x) <= radius and abs(uy - y) <= radius:
+                        found.append((sequence, unit))
+
+        found.sort(key=lambda entry: entry[0])
+        return [unit for sequence, unit in found]
+
+    def nearest(self, x, y):
+        """
+        Returns the unit closest to the square (x,y) by Manhattan distance and the distance.
+        Ties go to the unit inserted first. Returns (None, inf) if the index is empty.
+
+        Blocks are searched in rings around the block of (x,y). The search stops
+        once no square of the next ring can be as close as the best unit found.
+        """
+        block = self.block
+        cx = x // block
+        cy = y // block
+        best = None
+        best_key = (float("inf"), 0)
+        rings = max(cx, self.blocks_x - 1 - cx, cy, self.blocks_y - 1 - cy)
+
+        for ring in range(rings + 1):
+            if ring > 0 and (ring - 1) * block + 1 > best_key[0]:
+                break
+
+            for bx in range(cx - ring, cx + ring + 1):
+                if not 0 <= bx < self.blocks_x:
+                    continue
+                edge = bx == cx - ring or bx == cx + ring
+                for by in range(cy - ring, cy + ring + 1) if edge else (cy - ring, cy + ring):
+                    if not 0 <= by < self.blocks_y:
+                        continue
+                    for sequence, unit in self.buckets[bx * self.blocks_y + by]:
+                        ux, uy = self.entries[unit][:2]
+                        key = (abs(ux - x) + abs(uy - y), sequence)
+                        if key < best_key:
+                            best_key = key
+                            best = unit
+
+        return best, best_key[0]
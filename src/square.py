@@ -1,13 +1,38 @@
 
+
 class Square():
+    """
+    A Square is a thin view over one cell of a Grid. It holds no state of its own,
+    so any number of Square-objects can view the same cell and they compare equal.
+    """
+    __slots__ = ("x", "y", "grid")
 
-    def __init__(self, x, y):
+    def __init__(self, x, y, grid):
 
-        self.unit = None    # Current unit occupying the square. None if empty
-        self.obstacle = False    # True if square is an obstacle, false otherwise
-        self.neighbours = []    # A list of Square-objects
         self.x = x
         self.y = y
+        self.grid = grid    # The Grid-object this square belongs to
+
+    @property
+    def unit(self):
+        """
+        Current unit occupying the square. None if empty
+        """
+        return self.grid.get_unit(self.x, self.y)
+
+    @property
+    def obstacle(self):
+        """
+        True if square is an obstacle, false otherwise
+        """
+        return self.grid.is_obstacle(self.x, self.y)
+
+    @property
+    def neighbours(self):
+        """
+        A list of Square-objects
+        """
+        return [Square(x, y, self.grid) for x, y in self.grid.get_neighbours(self.x, self.y)]
 
     def get_character(self):
         """
@@ -22,46 +47,32 @@ class Square():
         Returns False otherwise.
         Used to check line of sight. The game assumes you can shoot past other units but not through walls!
         """
-        return self.obstacle
+        return self.grid.is_obstacle(self.x, self.y)
 
     def turn_into_obstacle(self):
         """
         Turns the Square object into an obstacle i.e. sets self.obstacle = True
         """
-        self.obstacle = True
+        self.grid.set_obstacle(self.x, self.y)
 
     def is_free(self):
         """
         Returns True if the Square is unoccupied and is not an obstacle.
         Otherwise returns False
         """
-        if self.unit is None and not self.obstacle:
-            return True
-        else:
-            return False
+        return self.grid.is_free(self.x, self.y)
 
     def add_unit_to_square(self, unit):
-        self.unit = unit
+        self.grid.place_unit(self.x, self.y, unit)
 
     def remove_unit_from_square(self):
         """
         Removes unit from this square i.e. sets self.unit = None
         """
-        self.unit = None
+        self.grid.clear_unit(self.x, self.y)
 
     def update_neighbours(self, grid, width, height):
-        offsetx = [0, 1, 0, -1]  # LEFT, DOWN, RIGHT, UP
-        offsety = [-1, 0, 1, 0]
-        self.neighbours = []
-
-        for i in range(4):
-            nx = self.x + offsetx[i]
-            ny = self.y + offsety[i]
-            if nx < 0 or nx > width - 1 or ny < 0 or ny > height - 1:
-                continue
-            if not grid[nx][ny].is_free():
-                continue
-            self.neighbours.append(grid[nx][ny])
+        self.grid.update_neighbours(self.x, self.y)
 
     def get_neighbours(self):
         return self.neighbours
@@ -69,6 +80,10 @@ class Square():
     def get_location(self):
         return self.x, self.y
 
+    def __eq__(self, other):
+        if not isinstance(other, Square):
+            return NotImplemented
+        return self.x == other.x and self.y == other.y and self.grid is other.grid
 
-
-
+    def __hash__(self):
+        return hash((self.x, self.y))
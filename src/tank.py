@@ -1,4 +1,3 @@
-import copy
 from unit import Unit
 import random
 
@@ -12,6 +11,8 @@ class Tank(Unit):
     A turret - moderately effective against foot soldiers
     """
 
+    __slots__ = ("cannon_cd",)
+
     def __init__(self, owner):
         super().__init__(owner)
         self.owner = owner
@@ -98,23 +99,34 @@ class Tank(Unit):
 
         return 75
 
-    def ai_attack(self, enemy):
+    def to_tuple(self):
+        return super().to_tuple() + (self.cannon_cd,)
+
+    def from_tuple(self, state):
+        super().from_tuple(state)
+        self.cannon_cd = state[5]
+
+    def attack_outcomes(self, attack_type, enemy):
         """
-        Determines which attack does most damage to 'enemy'
+        Returns every possible outcome of attack_type on 'enemy' (see Unit.attack_outcomes)
         """
-        attacks = []
+        if attack_type == 1:
+            if type(enemy) is Tank:
+                return self.roll_outcomes(range(200, 301))
+            return self.roll_outcomes((80 * (roll // 100) for roll in range(200, 301)), 1 / 5) + [(4 / 5, 0, 0, False)]
 
-        for attack in self.attack_types:
-            temp_enemy = copy.deepcopy(enemy)
-            temp_unit = copy.deepcopy(self)
-            if attack == 1 and self.cannon_cd != 0:    # If cannon is on cooldown, make sure it's not useable
-                attacks.append(-1)
-                continue
+        armour = enemy.get_armour()
+        return self.roll_outcomes(roll - armour for roll in range(50, 102))
+
+    def damage_model(self, enemy):
+        """
+        Returns (attack type, expected damage, chance to hit, cooldown added) for every attack usable on 'enemy'
+        """
+        attacks = []
 
-            temp_unit.attack(temp_enemy, attack)
-            damage = enemy.get_hitpoints() - temp_enemy.get_hitpoints()
-            attacks.append(damage)
+        if self.cannon_cd == 0:    # If cannon is on cooldown, it's not useable
+            attacks.append(self.model_attack(1, enemy, 4))
 
-        attack = attacks.index(max(attacks)) + 1
+        attacks.append(self.model_attack(2, enemy, 0))
 
-        self.attack(enemy, attack)
\ No newline at end of file
+        return attacks
@@ -1,6 +1,23 @@
 import unittest
+import random
+import timeit
+import weakref
 from game import Game
 from world import World
+from engine import Engine
+import selfplay
+import damage_table
+from unit_table import UnitTable
+from spatial_index import SpatialIndex
+from zobrist import TranspositionTable
+from search_ai import AnytimeAI
+from mcts import MCTS
+from attack_matrix import AttackMatrix
+from hpa_star import HierarchicalPathFinder
+from sniper import Sniper
+from commando import Commando
+from tank import Tank
+import a_star
 
 class Test(unittest.TestCase):
 
@@ -13,6 +30,21 @@ class Test(unittest.TestCase):
         self.test_game.set_world(self.test_world)
         self.test_world.add_obstacles()
 
+    def make_engine(self, size=10, obstacles=False, roster=(Sniper, Commando, Tank, Sniper, Commando)):
+        """
+        Returns a started Engine on a new size x size world, and the world.
+        The player's units are made from the classes in roster and the AI counter-picks them.
+        """
+        World.FIRST_UNIT_INDEX = 0
+        world = World(size, size)
+        if obstacles:
+            world.add_obstacles()
+        engine = Engine(self.test_game, world)
+        for unit_type in roster:
+            engine.add_unit(unit_type(self.test_game.get_player()))
+        engine.start()
+        return engine, world
+
     def test_world_generation(self):
         self.assertEqual(10, self.test_world.get_width(), "Width of the world should be 10")
         self.assertEqual(10, self.test_world.get_height(), "Height of the world should be 10")
@@ -32,5 +64,698 @@ class Test(unittest.TestCase):
         square = self.test_world.get_square(7, 6)
         self.assertTrue(square.is_obstacle(), "The square in (7,6) should be an obstacle")
 
+    def test_square_views(self):
+        """
+        Square-objects are views over the grid, so two views of the same cell see the same unit.
+        """
+        world = World(10, 10)
+        unit = Sniper(self.test_game.get_player())
+        world.get_square(4, 5).add_unit_to_square(unit)
+
+        self.assertEqual(world.get_square(4, 5), world.get_square(4, 5))
+        self.assertIs(unit, world.get_square(4, 5).get_character())
+        self.assertFalse(world.get_square(4, 5).is_free())
+
+        world.get_square(4, 5).remove_unit_from_square()
+        self.assertIsNone(world.get_square(4, 5).get_character())
+        self.assertTrue(world.get_square(4, 5).is_free())
+
+    def test_incremental_neighbours(self):
+        """
+        Moving units around should keep the neighbours equal to a full rebuild
+        """
+        unit = Sniper(self.test_game.get_player())
+        self.test_world.get_square(0, 0).add_unit_to_square(unit)
+        unit.update_location(0, 0)
+        self.assertNotIn(self.test_world.get_square(0, 0), self.test_world.get_square(0, 1).get_neighbours())
+
+        for x, y in [(0, 1), (5, 5), (9, 9), (9, 8)]:
+            self.test_world.get_square(*unit.get_location()).remove_unit_from_square()
+            self.test_world.get_square(x, y).add_unit_to_square(unit)
+            unit.update_location(x, y)
+            self.assertTrue(self.test_world.neighbours_consistent())
+
+    def test_pathfinder(self):
+        """
+        The path goes around a wall and the compatibility wrapper agrees with the engine
+        """
+        world = World(5, 5)
+        for y in range(4):
+            world.get_square(2, y).turn_into_obstacle()
+
+        path, cost = world.get_pathfinder().search((0, 0), (4, 0))
+        self.assertEqual(12, cost)
+        self.assertEqual((0, 0), path[0])
+        self.assertEqual((4, 0), path[-1])
+        self.assertIn((2, 4), path)
+        self.assertEqual(cost, a_star.a_star(world.get_grid(), world.get_square(0, 0), world.get_square(4, 0), False))
+
+        world.get_square(2, 4).turn_into_obstacle()
+        self.assertEqual((None, float("inf")), world.get_pathfinder().search((0, 0), (4, 0)))
+
+        finder = weakref.ref(world.get_pathfinder())
+        del world
+        self.assertIsNone(finder())  # The shared finder doesn't keep its grid alive and goes with it
+
+    def test_reachable_squares(self):
+        """
+        A sniper (speed 2) can reach squares two steps away but not through walls.
+        The reachable squares are recalculated when the grid changes.
+        """
+        world = World(5, 5)
+        unit = Sniper(self.test_game.get_player())
+        world.get_square(0, 0).add_unit_to_square(unit)
+        unit.update_location(0, 0)
+        world.get_square(0, 1).turn_into_obstacle()
+
+        self.assertTrue(world.can_move(unit, world.get_square(1, 1)))
+        self.assertTrue(world.can_move(unit, world.get_square(2, 0)))
+        self.assertFalse(world.can_move(unit, world.get_square(0, 2)))
+        self.assertFalse(world.can_move(unit, world.get_square(0, 0)))
+
+        world.get_square(1, 0).turn_into_obstacle()
+        self.assertFalse(world.can_move(unit, world.get_square(1, 1)))
+
+    def test_move_closer(self):
+        """
+        When the square left of the enemy is walled off, the AI unit heads for the next free neighbour
+        and stops at the furthest square its speed allows.
+        """
+        world = World(10, 10)
+        enemy = Sniper(self.test_game.get_player())
+        unit = Commando(self.test_game.get_ai())
+        world.place_unit(enemy, 5, 5)
+        world.place_unit(unit, 0, 0)
+        for x, y in [(4, 4), (5, 3), (6, 4)]:
+            world.get_square(x, y).turn_into_obstacle()
+
+        square, closest = world.move_closer(unit)
+        self.assertIs(enemy, closest)
+        self.assertEqual(5, world.get_reachable(unit)[square.get_location()])
+        path, total = world.get_pathfinder().search((0, 0), (6, 5))
+        path, remaining = world.get_pathfinder().search(square.get_location(), (6, 5))
+        self.assertEqual(total - 5, remaining)
+
+    def test_visibility_cache(self):
+        """
+        Repeated line of sight queries are answered from the cache until a wall is added
+        """
+        world = World(10, 10)
+        self.assertTrue(world.line_of_sight((0, 0), (0, 9)))
+        self.assertTrue(world.line_of_sight((0, 9), (0, 0)))
+        stats = world.get_visibility_stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+
+        world.get_square(0, 5).turn_into_obstacle()
+        self.assertFalse(world.line_of_sight((0, 0), (0, 9)))
+        self.assertEqual(1, world.get_visibility_stats()["invalidations"])
+
+    def test_line_of_sight_many(self):
+        """
+        The batch query agrees with single line of sight checks, including the diagonal corner rule
+        """
+        world = World(10, 10)
+        world.get_square(4, 5).turn_into_obstacle()
+        world.get_square(5, 4).turn_into_obstacle()
+        world.get_square(2, 7).turn_into_obstacle()
+
+        sources = [(x, y) for x in range(10) for y in range(10)] * 2
+        targets = [(9 - y, x) for x, y in sources]
+        results = world.line_of_sight_many(sources, targets)
+
+        self.assertFalse(world.line_of_sight_many([(3, 3)], [(6, 6)])[0])
+        fresh = World(10, 10)
+        for x, y in [(4, 5), (5, 4), (2, 7)]:
+            fresh.get_square(x, y).turn_into_obstacle()
+        self.assertEqual([fresh.line_of_sight(s, t) for s, t in zip(sources, targets)], results)
+
+        random.seed(5)
+        world = World(13, 7)  # Not square, so rows and columns can't be mixed up
+        for i in range(25):
+            world.get_square(random.randrange(13), random.randrange(7)).turn_into_obstacle()
+        squares = [(x, y) for x in range(13) for y in range(7)]
+        sources = [random.choice(squares) for i in range(2000)]
+        targets = [random.choice(squares) for i in range(2000)]
+        self.assertEqual([world.line_of_sight(s, t) for s, t in zip(sources, targets)],
+                         world.line_of_sight_many(sources, targets))
+
+    def test_field_of_view(self):
+        """
+        The field of view of a sniper contains exactly the squares in range it has line of sight to
+        """
+        self.test_world.get_square(4, 5).turn_into_obstacle()
+        self.test_world.get_square(5, 4).turn_into_obstacle()
+
+        for origin in [(3, 3), (0, 9), (5, 5)]:
+            expected = set()
+            for x in range(10):
+                for y in range(10):
+                    if max(abs(x - origin[0]), abs(y - origin[1])) <= 8 and self.test_world.line_of_sight(origin, (x, y)):
+                        expected.add((x, y))
+            self.assertEqual(expected, self.test_world.field_of_view(origin, 8))
+
+        self.assertNotIn((6, 6), self.test_world.field_of_view((3, 3), 8))
+
+    def test_headless_engine(self):
+        """
+        A whole game can be played through the engine without a GUI.
+        The player never acts, so the AI should win.
+        """
+        World.FIRST_UNIT_INDEX = 0
+        engine = Engine(self.test_game, World(10, 10))
+        for i in range(5):
+            self.assertTrue(engine.add_unit(Sniper(self.test_game.get_player())))
+        self.assertFalse(engine.add_unit(Sniper(self.test_game.get_player())))
+        engine.start()
+
+        unit = engine.get_world().get_player_units()[0]
+        self.assertEqual(("This tile is occupied! Try a different one!", False), engine.move(unit, 0, 3))
+
+        while engine.result() is None and engine.turns < 1000:
+            engine.end_turn()
+            engine.ai_turn()
+            engine.end_turn()
+
+        self.assertIs(self.test_game.get_ai(), engine.result())
+        self.assertTrue(all(unit.is_alive() for unit in engine.get_world().get_ai_units()))
+
+    def test_selfplay_match(self):
+        """
+        An AI-vs-AI match is reproducible from its seed
+        """
+        first = selfplay.play_match(7, 10, 200)
+        second = selfplay.play_match(7, 10, 200)
+        self.assertIn(first["winner"], ("player", "ai", None))
+        self.assertEqual(5, len(first["ai_roster"]))
+        for key in ("player_roster", "ai_roster", "winner", "turns"):
+            self.assertEqual(first[key], second[key])
+
+        summary = selfplay.Summary()
+        summary.add(first)
+        self.assertEqual(1, summary.games)
+
+        summary = selfplay.Summary()
+        summary.add(dict(first, ai_roster=["Sniper"] * 5, player_roster=["Tank"] * 4 + ["Sniper"], winner="ai"))
+        self.assertEqual(2, summary.unit_games["Sniper"])  # Two rosters, not six units
+        self.assertEqual(1, summary.unit_wins["Sniper"])
+
+    def test_damage_model(self):
+        """
+        The AI picks attacks from the expected damage without copying units
+        """
+        tank = Tank(self.test_game.get_ai())
+        enemy_tank = Tank(self.test_game.get_player())
+        attacks = {attack[0]: attack for attack in tank.damage_model(enemy_tank)}
+        self.assertEqual((1, 250.0, 1.0, 4), attacks[1])
+        self.assertAlmostEqual(1 / 52, attacks[2][1])  # Only a roll of 101 gets through the armour
+
+        tank.ai_attack(enemy_tank)
+        self.assertEqual(4, tank.cannon_cd)  # The cannon was fired
+        self.assertEqual([2], [attack[0] for attack in tank.damage_model(enemy_tank)])
+
+        commando = Commando(self.test_game.get_ai())
+        sniper = Sniper(self.test_game.get_player())
+        attacks = {attack[0]: attack for attack in commando.damage_model(sniper)}
+        self.assertAlmostEqual(105, attacks[2][1])
+        self.assertAlmostEqual(1 / 3, attacks[1][2])
+        commando.ai_attack(sniper)
+        self.assertEqual(0, commando.bazooka_cd)  # The rifle was used
+        self.assertEqual(0, sniper.bleed)
+
+    def test_kill_probability(self):
+        """
+        The damage tables give exact kill chances, including bleeding after the attack
+        """
+        sniper = Sniper(self.test_game.get_ai())
+        target = Sniper(self.test_game.get_player())
+        table = damage_table.get_table(sniper, 1, target)
+        self.assertAlmostEqual(1.0, sum(table.distribution.values()))
+        self.assertAlmostEqual(100 - target.get_armour(), table.expected_damage(1000))  # The average roll is 100
+
+        target.hitpoints = 90
+        self.assertAlmostEqual(1 / 21, self.test_world.kill_probability(sniper, target))  # Only the best roll kills
+        self.assertAlmostEqual(11 / 21, self.test_world.kill_probability(sniper, target, 2))  # Two bleed ticks add 10
+
+        target.hitpoints = 1000
+        self.assertEqual(0.0, self.test_world.kill_probability(sniper, target, 2))
+
+        tank = Tank(self.test_game.get_player())
+        commando = Commando(self.test_game.get_ai())
+        self.assertEqual(0.0, damage_table.get_table(commando, 3, tank).hit_chance)  # The knife can't hurt tanks
+        self.assertGreater(damage_table.precompute([Sniper, Commando, Tank]), 0)
+
+    def test_unit_state(self):
+        """
+        Units have no __dict__ and their state survives a round trip through a tuple
+        """
+        commando = Commando(self.test_game.get_ai())
+        self.assertFalse(hasattr(commando, "__dict__"))
+        with self.assertRaises(AttributeError):
+            commando.cannon_cd = 4
+
+        commando.update_location(2, 3)
+        commando.hitpoints = 120
+        commando.bleed = 2
+        commando.bazooka_cd = 6
+        state = commando.to_tuple()
+        self.assertEqual((120, 10, 2, True, (2, 3), 6), state)
+
+        clone = commando.clone()
+        self.assertIsNot(clone, commando)
+        self.assertEqual(state, clone.to_tuple())
+
+        commando.defend(500)
+        self.assertFalse(commando.is_alive())
+        commando.from_tuple(state)
+        self.assertTrue(commando.is_alive())
+        self.assertEqual(state, commando.to_tuple())
+
+    def test_unit_table(self):
+        """
+        The end-of-turn tick and range checks of a UnitTable match the unit objects
+        """
+        units = []
+        for i in range(200):
+            unit = [Sniper, Commando, Tank][i % 3](self.test_game.get_player())
+            unit.update_location(i % 20, i // 20)
+            unit.hitpoints = 1 + i % 12
+            unit.bleed = i % 4
+            if type(unit) is Commando:
+                unit.bazooka_cd = i % 7
+            units.append(unit)
+
+        table = UnitTable.from_units(units)
+        clones = [unit.clone() for unit in units]
+        dead = table.end_turn()
+        table.write_back()
+
+        for i, unit in enumerate(clones):
+            unit.take_bleeding_damage()
+            unit.reduce_attack_cd()
+            self.assertEqual(unit.to_tuple(), units[i].to_tuple())
+            self.assertEqual(not unit.is_alive(), i in dead)
+
+        enemies = UnitTable.from_units([Sniper(self.test_game.get_ai())])
+        enemies.x[0], enemies.y[0] = 5, 5
+        expected = [i for i, unit in enumerate(units) if units[i].is_alive()
+                    and max(abs(unit.get_location()[0] - 5), abs(unit.get_location()[1] - 5)) <= unit.get_range()]
+        self.assertEqual(expected, table.in_range_of(5, 5))
+        self.assertEqual([0], enemies.within(7, 3, 2))
+        self.assertEqual(len(self.test_world.get_player_units()), len(self.test_world.get_unit_table(0)))
+
+    def test_spatial_index(self):
+        """
+        Range and nearest queries of the spatial index match a scan of the units in list order
+        """
+        index = SpatialIndex(40, 30, block=4)
+        units = [Sniper(self.test_game.get_player()) for i in range(60)]
+        for i, unit in enumerate(units):
+            unit.update_location((i * 7) % 40, (i * 11) % 30)
+            index.insert(unit, unit.get_location()[0], unit.get_location()[1])
+        for unit in units[::5]:
+            index.remove(unit)
+        for i, unit in enumerate(units[1::5]):
+            unit.update_location(i, 29 - i)
+            index.move(unit, i, 29 - i)
+        remaining = [unit for i, unit in enumerate(units) if i % 5 != 0]
+
+        for x, y, radius in [(0, 0, 3), (20, 15, 5), (39, 29, 8), (10, 25, 0), (5, 5, 40)]:
+            expected = [u for u in remaining if max(abs(u.get_location()[0] - x), abs(u.get_location()[1] - y)) <= radius]
+            self.assertEqual(expected, index.within(x, y, radius))
+
+            distances = [abs(u.get_location()[0] - x) + abs(u.get_location()[1] - y) for u in remaining]
+            closest, distance = index.nearest(x, y)
+            self.assertEqual(min(distances), distance)
+            self.assertIs(remaining[distances.index(distance)], closest)
+
+        self.assertEqual((None, float("inf")), SpatialIndex(10, 10).nearest(3, 3))
+
+        world = World(10, 10)  # A death and a new unit between lookups keep the count but change the units
+        first, second = Sniper(self.test_game.get_player()), Tank(self.test_game.get_player())
+        world.place_unit(first, 2, 2)
+        world.remove_unit(first, 0)
+        world.place_unit(second, 7, 7)
+        self.assertEqual([second], world.get_unit_index(0).within(5, 5, 5))
+        sequence = world.get_unit_index(0).get_sequence(second)
+        world.remove_unit(second, 0)
+        world.restore_unit(second, 0, 0, sequence)
+        self.assertEqual(sequence, world.get_unit_index(0).get_sequence(second))
+
+    def test_apply_undo(self):
+        """
+        Undoing a sequence of actions restores the units, the grid, the unit lists and the turn exactly
+        """
+        random.seed(3)
+        engine, world = self.make_engine()
+
+        def snapshot():
+            units = [[(unit, unit.to_tuple()) for unit in world.get_forces(side)[0]] for side in (0, 1)]
+            grid = world.get_grid()
+            cells = [grid.get_unit(x, y) for x in range(10) for y in range(10)]
+            nearest = [world.get_unit_index(side).nearest(5, 5) for side in (0, 1)]
+            return (units, cells, bytes(grid.neighbour_masks), nearest, list(self.test_game.turn),
+                    self.test_game.whose_turn(), engine.turns)
+
+        start = snapshot()
+        records = []
+        while len(records) < 40 and engine.result() is None:
+            units, enemies = world.get_forces(engine.current_side())
+            unit, square = world.get_best_move(engine.current_side())
+            if unit is not None:
+                records.append(engine.apply(("move", unit, square.get_location()[0], square.get_location()[1])))
+            for unit in units:
+                for enemy in enemies:
+                    record = engine.apply(("ai_attack", unit, enemy))
+                    if record is not None:
+                        records.append(record)
+            records.append(engine.apply(("end_turn",)))
+
+        self.assertNotEqual(start, snapshot())
+        self.assertEqual(engine.compute_hash(), engine.hash)
+        unit = world.get_ai_units()[0]
+        self.assertIsNone(engine.apply(("move", unit, unit.get_location()[0], unit.get_location()[1])))
+        self.assertLess(len(world.get_player_units()) + len(world.get_ai_units()), 10)  # Some units were removed
+        for record in reversed(records):
+            engine.undo(record)
+
+        self.assertEqual(start, snapshot())
+        self.assertTrue(world.neighbours_consistent())
+
+    def test_zobrist_hash(self):
+        """
+        The incremental hash matches a full rehash, is the same for transposed move orders and is restored by undo
+        """
+        engine, world = self.make_engine(roster=[Commando, Commando])
+        first, second = world.get_player_units()
+        start = engine.hash
+
+        records = [engine.apply(("move", first, 8, first.get_location()[1])), engine.apply(("end_turn",)),
+                   engine.apply(("end_turn",)), engine.apply(("move", second, 8, second.get_location()[1]))]
+        self.assertEqual(engine.compute_hash(), engine.hash)
+        moved_first = engine.hash
+        for record in reversed(records):
+            engine.undo(record)
+        self.assertEqual(start, engine.hash)
+
+        records = [engine.apply(("move", second, 8, second.get_location()[1])), engine.apply(("end_turn",)),
+                   engine.apply(("end_turn",)), engine.apply(("move", first, 8, first.get_location()[1]))]
+        self.assertEqual(moved_first, engine.hash)
+
+        table = TranspositionTable(16)
+        table.store(engine.hash, 2, 1.5, records[0][0])
+        self.assertFalse(table.store(engine.hash + 16, 1, 0.0))  # Same slot, shallower: the deeper entry stays
+        self.assertEqual(1.5, table.lookup(engine.hash)[3])
+        table.new_search()
+        self.assertTrue(table.store(engine.hash + 16, 1, 0.0))  # Old entries can be replaced
+        self.assertIsNone(table.lookup(engine.hash))
+        self.assertEqual(1, table.get_stats()["replacements"])
+
+    def test_anytime_ai(self):
+        """
+        The searching AI answers within its budget and leaves the game and the random generator as they were
+        """
+        random.seed(5)
+        engine, world = self.make_engine(12, obstacles=True)
+        engine.end_turn()
+
+        actions = engine.legal_actions()
+        self.assertEqual(("end_turn",), actions[-1])
+        self.assertTrue(all(action[1] in world.get_ai_units() for action in actions[:-1]))
+
+        ai = AnytimeAI(engine, budget=0.05)
+        start_hash = engine.hash
+        random_state = random.getstate()
+        start_time = timeit.default_timer()
+        move, attack = ai.choose_turn()
+
+        self.assertLess(timeit.default_timer() - start_time, 0.5)
+        self.assertGreaterEqual(ai.depth, 1)
+        self.assertEqual(start_hash, engine.hash)
+        self.assertEqual(random_state, random.getstate())
+        self.assertIn(move, actions + [None])
+
+        moved, unit, enemy = ai.play_turn()
+        self.assertEqual(engine.compute_hash(), engine.hash)
+
+        engine, world = self.make_engine(300)  # On a large map the budget still holds
+        engine.end_turn()
+        ai = AnytimeAI(engine, budget=0)
+        move, attack = ai.choose_turn()
+        self.assertEqual(0, ai.nodes)  # The candidates aren't generated past the deadline either
+        self.assertIsNotNone(move)  # The fallback still steps towards the enemy
+
+        ai = AnytimeAI(engine, budget=0.05)
+        start_time = timeit.default_timer()
+        ai.choose_turn()
+        self.assertLess(timeit.default_timer() - start_time, 1)
+
+    def test_mcts(self):
+        """
+        MCTS runs its iterations without changing the game and plans only actions of the side to move
+        """
+        random.seed(7)
+        engine, world = self.make_engine(obstacles=True)
+        engine.end_turn()
+
+        ai = MCTS(engine, budget=None, iterations=50)
+        start_hash = engine.hash
+        random_state = random.getstate()
+        actions = ai.choose_actions()
+
+        self.assertEqual(50, ai.rollouts)
+        self.assertEqual(50, ai.root.visits)
+        self.assertEqual(start_hash, engine.hash)
+        self.assertEqual(random_state, random.getstate())
+        self.assertTrue(all(action[1] in world.get_ai_units() for action in actions))
+        self.assertTrue(all(action in engine.legal_actions() for action in actions[:1]))
+
+        moved, unit, enemy = ai.play_turn()
+        self.assertEqual(engine.compute_hash(), engine.hash)
+
+    def test_distance_field(self):
+        """
+        The distance field matches the shortest path to the closest free square next to an enemy,
+        and AI units step to the reachable square closest to the enemies
+        """
+        random.seed(11)
+        engine, world = self.make_engine(12, obstacles=True)
+
+        field = world.get_distance_field(0)
+        self.assertIs(field, world.get_distance_field(0))
+        grid = world.get_grid()
+        for unit in world.get_ai_units():  # The AI's own units don't block the way to the player's units
+            world.get_square(*unit.get_location()).remove_unit_from_square()
+        goals = [goal for unit in world.get_player_units() for goal in grid.get_neighbours(*unit.get_location())]
+        for x in range(12):
+            for y in range(12):
+                if not grid.is_free(x, y):
+                    continue
+                costs = [world.get_pathfinder().search((x, y), goal)[1] for goal in goals]
+                expected = min(costs) if min(costs) != float("inf") else -1
+                self.assertEqual(expected, field[x * 12 + y])
+        for unit in world.get_ai_units():
+            world.get_square(*unit.get_location()).add_unit_to_square(unit)
+
+        unit = world.get_ai_units()[1]
+        square = world.step_toward_enemies(unit)
+        reachable = world.get_reachable(unit)
+        self.assertEqual(min(field[x * 12 + y] for x, y in reachable if field[x * 12 + y] >= 0),
+                         field[square.get_location()[0] * 12 + square.get_location()[1]])
+
+        world.move_unit(unit, *square.get_location())
+        self.assertIs(field, world.get_distance_field(0))  # Kept while the AI moves
+
+        mover = world.get_player_units()[0]
+        world.move_unit(mover, *next(iter(world.get_reachable(mover))))
+        self.assertIsNot(field, world.get_distance_field(0))
+
+    def test_threat_map(self):
+        """
+        The threat map adds up the average damage of every enemy that has a square in range and line of sight
+        """
+        random.seed(13)
+        engine, world = self.make_engine(12, obstacles=True)
+
+        defender = world.get_ai_units()[0]
+        threat = world.get_threat_map(0, defender)
+        for x in range(12):
+            for y in range(12):
+                expected = sum(unit.average_damage(defender) for unit in world.get_player_units()
+                               if max(abs(unit.get_location()[0] - x), abs(unit.get_location()[1] - y)) <= unit.get_range()
+                               and world.line_of_sight(unit.get_location(), (x, y)))
+                self.assertAlmostEqual(expected, threat[x * 12 + y])
+        self.assertEqual(threat[5 * 12 + 5], world.get_exposure(defender, world.get_square(5, 5)))
+
+        self.assertIs(threat, world.get_threat_map(0, defender))
+        world.get_player_units()[1].bazooka_cd = 6  # The commando's damage changes with its cooldown
+        world.units_changed(0)
+        self.assertIsNot(threat, world.get_threat_map(0, defender))
+        threat = world.get_threat_map(0, defender)
+        free = next((x, y) for x in range(12) for y in range(12) if world.get_grid().is_free(x, y))
+        world.move_unit(world.get_ai_units()[1], *free)
+        self.assertIs(threat, world.get_threat_map(0, defender))  # The other side's moves don't matter
+
+    def test_coverage_map(self):
+        """
+        The coverage map marks exactly the squares from which an enemy is in range and line of sight
+        """
+        random.seed(17)
+        engine, world = self.make_engine(12, obstacles=True)
+
+        for unit in world.get_ai_units():
+            for x in range(12):
+                for y in range(12):
+                    expected = [enemy for enemy in world.get_player_units()
+                                if max(abs(enemy.get_location()[0] - x), abs(enemy.get_location()[1] - y)) <= unit.get_range()
+                                and world.line_of_sight((x, y), enemy.get_location())]
+                    square = world.get_square(x, y)
+                    self.assertEqual(expected, world.attackable_from(unit, square))
+                    self.assertEqual(bool(expected), world.can_attack_from_square(unit, square))
+
+        coverage = world.get_coverage(0, 3)
+        self.assertIs(coverage, world.get_coverage(0, 3))
+        world.remove_unit(world.get_player_units()[0], 0)
+        self.assertIsNot(coverage, world.get_coverage(0, 3))
+
+        coverage = world.get_coverage(0, 3)
+        free = [(x, y) for x in range(12) for y in range(12) if world.get_grid().is_free(x, y)]
+        world.move_unit(world.get_ai_units()[0], *free[0])
+        self.assertIs(coverage, world.get_coverage(0, 3))  # Only the units of side 0 matter
+        world.move_unit(world.get_player_units()[0], *free[1])
+        self.assertIsNot(coverage, world.get_coverage(0, 3))
+
+    def test_attack_matrix(self):
+        """
+        The attack matrix is updated in place when a unit moves and matches a freshly built one
+        """
+        random.seed(19)
+        engine, world = self.make_engine()
+
+        for side in (1, 0, 1, 0):
+            matrix = world.get_attack_matrix(side)
+            unit, square = world.get_best_move(side)
+            world.move_unit(unit, *square.get_location())
+            self.assertIs(matrix, world.get_attack_matrix(side))
+            self.assertEqual(AttackMatrix(world, side).rows, matrix.rows)
+            other = world.get_attack_matrix(1 - side)
+            self.assertEqual(AttackMatrix(world, 1 - side).rows, other.rows)
+
+        attacker, enemy = world.ai_attack(0)
+        self.assertIn(enemy, [entry[0] for entry in matrix.get_targets(attacker)])
+        self.assertTrue(engine.ai_attack(attacker, enemy))
+        self.assertFalse(matrix.is_valid())  # An attack changes hitpoints and cooldowns
+
+    def test_landmarks(self):
+        """
+        The landmark bounds never exceed the real distance, and A* finds equally short paths with fewer expansions
+        """
+        world = World(12, 12)
+        for x in range(2, 12, 3):  # Walls with a gap at alternating ends
+            for y in range(12):
+                if y != (0 if x % 2 else 11):
+                    world.get_square(x, y).turn_into_obstacle()
+
+        grid = world.get_grid()
+        landmarks = a_star.Landmarks.for_grid(grid, 4)
+        self.assertEqual(4, len(landmarks.landmarks))
+        finder = world.get_pathfinder()
+        start = grid.index(0, 11)
+        exact = landmarks.breadth_first(start)
+        for index in range(len(exact)):
+            if exact[index] >= 0:
+                self.assertLessEqual(landmarks.bound(start, index), exact[index])
+
+        cost = finder.search((0, 11), (7, 11))[1]
+        manhattan = finder.expanded
+        finder.use_landmarks(4)
+        self.assertEqual(cost, finder.search((0, 11), (7, 11))[1])
+        self.assertEqual(exact[grid.index(7, 11)], cost)
+        self.assertLess(finder.expanded, manhattan)
+
+        world.get_square(0, 5).turn_into_obstacle()
+        self.assertIsNot(landmarks, a_star.Landmarks.for_grid(grid, 4))  # New walls make new landmarks
+        finder.use_landmarks(0)
+
+        landmarks = weakref.ref(a_star.Landmarks.for_grid(grid, 4))
+        del world, grid, finder
+        self.assertIsNone(landmarks())  # The landmarks don't keep their grid alive and go with it
+
+    def test_landmark_areas(self):
+        """
+        Every area walled off from the rest gets its own landmarks, and a map of many small areas is set up quickly
+        """
+        world = World(12, 12)
+        for y in range(12):  # A wall splits the map into a 5 wide and a 6 wide area
+            world.get_square(5, y).turn_into_obstacle()
+        grid = world.get_grid()
+        landmarks = a_star.Landmarks.for_grid(grid, 2)
+        self.assertEqual(4, len(landmarks.landmarks))
+        self.assertEqual({True, False}, {index // 12 < 5 for index in landmarks.landmarks})
+
+        finder = world.get_pathfinder()
+        finder.use_landmarks(2)
+        self.assertEqual(15, finder.search((0, 0), (4, 11))[1])
+        self.assertEqual(16, finder.search((6, 0), (11, 11))[1])
+        self.assertIsNone(finder.search((0, 0), (11, 11))[0])
+        finder.use_landmarks(0)
+
+        world = World(150, 150)
+        for x in range(150):
+            for y in range(150):
+                if x % 2 or y % 2:  # Thousands of one square pockets
+                    world.get_square(x, y).turn_into_obstacle()
+        landmarks = a_star.Landmarks.for_grid(world.get_grid(), 8)
+        self.assertEqual(75 * 75, len(landmarks.landmarks))
+        self.assertEqual(2 * 75 * 75, landmarks.expanded)  # Each pocket is labelled once and searched from its landmark
+
+    def test_hierarchical_pathfinder(self):
+        """
+        HPA* finds valid paths wherever A* does, and follows walls and units added after its clusters were built
+        """
+        random.seed(7)
+        world = World(30, 30)
+        for i in range(6):
+            world.add_obstacles()
+        grid = world.get_grid()
+        finder = world.get_pathfinder()
+        hierarchy = HierarchicalPathFinder(world, 8)
+        free = [(x, y) for x in range(30) for y in range(30) if grid.is_free(x, y)]
+
+        for i in range(100):
+            start, end = random.choice(free), random.choice(free)
+            path, cost = hierarchy.search(start, end)
+            self.assertEqual(finder.search(start, end)[0] is None, path is None)
+            if path is not None:
+                self.assertEqual((start, end), (path[0], path[-1]))
+                self.assertGreaterEqual(cost, finder.search(start, end)[1])
+                self.assertTrue(all(abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(path, path[1:])))
+
+        world = World(20, 20)
+        hierarchy = HierarchicalPathFinder(world, 5)
+        self.assertIsNotNone(hierarchy.search((0, 0), (19, 0))[0])
+        for y in range(19):  # A wall across the map with a gap at the end, right through the built clusters
+            world.get_square(10, y).turn_into_obstacle()
+        world.get_square(10, 19).add_unit_to_square(Sniper(self.test_game.get_player()))
+        self.assertEqual((None, float("inf")), hierarchy.search((0, 0), (19, 0)))
+        world.get_square(10, 19).remove_unit_from_square()
+        cost = hierarchy.search((0, 0), (19, 0))[1]
+        self.assertIn((10, 19), hierarchy.search((0, 0), (19, 0))[0])
+        self.assertGreaterEqual(cost, world.get_pathfinder().search((0, 0), (19, 0))[1])
+
+        world.set_pathfinder(hierarchy)
+        self.assertIs(hierarchy, world.get_pathfinder())
+        self.assertEqual(cost, a_star.a_star(world.get_grid(), world.get_square(0, 0), world.get_square(19, 0), False))
+        world.set_pathfinder(HierarchicalPathFinder(world, 5))
+        self.assertEqual(1, len(world.get_grid().listeners))  # The replaced finder was detached
+        world.set_pathfinder(None)
+        self.assertIsNot(hierarchy, world.get_pathfinder())
+        self.assertEqual([], world.get_grid().listeners)
+
+        world.set_pathfinder(HierarchicalPathFinder(world, 5))
+        finder = weakref.ref(world.get_pathfinder())
+        del world
+        self.assertIsNone(finder())  # The finder and the grid don't keep each other alive
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,8 +1,14 @@
+import damage_table
+
 """
 The Unit class is inherited by all unit subclasses as it contains many methods shared by all units.
+Units use __slots__, and everything that changes during a game can be read and restored as one tuple
+with to_tuple() and from_tuple(). Searches copy units with clone(), which is built on the same tuples.
 """
 
 class Unit():
+    __slots__ = ("owner", "hitpoints", "max_hp", "armour", "alive", "location", "name", "speed", "range",
+                 "attack_types", "bleed")
 
     def __init__(self, owner):
         self.owner = owner
@@ -142,4 +148,73 @@ class Unit():
         """
         Overwritten in commando.py and tank.py
         """
-        pass
\ No newline at end of file
+        pass
+
+    def to_tuple(self):
+        """
+        Returns the state of the unit that changes during a game as a tuple:
+        (hitpoints, armour, bleed, alive, location) followed by the cooldowns and flags of the subclass
+        """
+        return self.hitpoints, self.armour, self.bleed, self.alive, self.location
+
+    def from_tuple(self, state):
+        """
+        Restores a state returned by to_tuple()
+        """
+        self.hitpoints, self.armour, self.bleed, self.alive, self.location = state[:5]
+
+    def clone(self):
+        """
+        Returns a new unit of the same type and owner in the same state.
+        The clone is not placed on any world.
+        """
+        unit = type(self)(self.owner)
+        unit.from_tuple(self.to_tuple())
+        return unit
+
+    def roll_outcomes(self, damages, chance=1.0, bleed=0):
+        """
+        Turns a roll that picks one of 'damages' with equal probability into attack outcomes
+        (probability, damage, bleed rounds, hit). Like defend(), negative damage counts as 0.
+        :param chance: The chance that the attack hits at all
+        :param bleed: Bleed rounds the attack applies when it hits
+        """
+        damages = list(damages)
+        probability = chance / len(damages)
+        return [(probability, max(0, damage), bleed, True) for damage in damages]
+
+    def attack_outcomes(self, attack_type, enemy):
+        """
+        Returns every possible outcome of attack_type on 'enemy' as a list of
+        (probability, damage, bleed rounds applied, hit) tuples. Misses are outcomes with hit False.
+        Overwritten in the unit subclasses
+        """
+        return [(1.0, 0, 0, False)]
+
+    def model_attack(self, attack_type, enemy, cooldown):
+        """
+        Returns the damage_model() entry of attack_type on 'enemy', read from the exact damage tables
+        """
+        table = damage_table.get_table(self, attack_type, enemy)
+        return attack_type, table.expected_damage(enemy.get_hitpoints()), table.hit_chance, cooldown
+
+    def damage_model(self, enemy):
+        """
+        Returns a list of (attack type, expected damage, chance to hit, cooldown added) tuples,
+        one for every attack the unit can use on 'enemy' right now.
+        Overwritten in the unit subclasses
+        """
+        return []
+
+    def ai_attack(self, enemy):
+        """
+        Attacks 'enemy' with the attack that has the highest expected damage according to damage_model().
+        Ties go to the attack listed first, so the choice only depends on the state of the two units.
+        """
+        best = None
+        for attack in self.damage_model(enemy):
+            if best is None or attack[1] > best[1]:
+                best = attack
+
+        if best is not None:
+            self.attack(enemy, best[0])
\ No newline at end of file
@@ -0,0 +1,134 @@
+from array import array
+from sniper import Sniper
+from commando import Commando
+from tank import Tank
+from ravager import Ravager
+
+"""
+The UnitTable class stores the units of one side column-wise: one flat array per stat
+(type, x, y, hitpoints, armour, range, speed, bleed, cooldown, alive) with one row per unit.
+It is meant for simulating battles with hundreds of units per side, where looping over
+unit objects in nested loops is too slow. The helpers work on whole columns at once.
+
+A table is a copy: it is filled from unit objects with from_units() and the changed stats
+are written back to them with write_back().
+"""
+
+TYPES = [Sniper, Commando, Tank, Ravager]  # Row type codes are indices into this list
+COOLDOWNS = {Commando: "bazooka_cd", Tank: "cannon_cd"}  # The attribute each type keeps its cooldown in
+BLEED_DAMAGE = 5
+
+
+class UnitTable():
+
+    def __init__(self):
+        self.units = []  # The unit object of every row
+        self.types = array("b")
+        self.x = array("i")
+        self.y = array("i")
+        self.hitpoints = array("i")
+        self.armour = array("i")
+        self.range = array("i")
+        self.speed = array("i")
+        self.bleed = array("i")
+        self.cooldown = array("i")
+        self.alive = array("b")
+
+    @classmethod
+    def from_units(cls, units):
+        """
+        Returns a new table with one row for every unit in units, in the same order
+        """
+        table = cls()
+        for unit in units:
+            table.append(unit)
+        return table
+
+    def __len__(self):
+        return len(self.units)
+
+    def append(self, unit):
+        """
+        Adds a row for unit and returns its index
+        """
+        location = unit.get_location() or (-1, -1)  # Units that haven't been placed are at (-1,-1)
+        cooldown = COOLDOWNS.get(type(unit))
+
+        self.units.append(unit)
+        self.types.append(TYPES.index(type(unit)))
+        self.x.append(location[0])
+        self.y.append(location[1])
+        self.hitpoints.append(unit.get_hitpoints())
+        self.armour.append(unit.get_armour())
+        self.range.append(unit.get_range())
+        self.speed.append(unit.get_speed())
+        self.bleed.append(unit.bleed)
+        self.cooldown.append(getattr(unit, cooldown) if cooldown else 0)
+        self.alive.append(unit.is_alive())
+        return len(self.units) - 1
+
+    def write_back(self):
+        """
+        Copies the stats that change during a turn (location, hitpoints, bleed, cooldown, alive) back to the units
+        """
+        for i, unit in enumerate(self.units):
+            if self.x[i] >= 0:
+                unit.update_location(self.x[i], self.y[i])
+            unit.hitpoints = self.hitpoints[i]
+            unit.bleed = self.bleed[i]
+            unit.alive = bool(self.alive[i])
+            cooldown = COOLDOWNS.get(type(unit))
+            if cooldown:
+                setattr(unit, cooldown, self.cooldown[i])
+
+    def take_bleeding_damage(self):
+        """
+        Every bleeding unit loses 5 hitpoints and one round of bleeding, like Unit.take_bleeding_damage.
+        Returns the indices of the units that died.
+        """
+        bleeding = [b > 0 for b in self.bleed]
+        self.hitpoints = array("i", [hp - BLEED_DAMAGE if b else hp for hp, b in zip(self.hitpoints, bleeding)])
+        self.bleed = array("i", [b - 1 if b > 0 else 0 for b in self.bleed])
+
+        dead = [i for i, (hp, b, a) in enumerate(zip(self.hitpoints, bleeding, self.alive)) if b and hp < 1 and a]
+        for i in dead:  # The rule of Unit.update_status
+            self.alive[i] = 0
+            self.hitpoints[i] = 0
+            self.bleed[i] = 0
+        return dead
+
+    def reduce_attack_cd(self):
+        """
+        Reduces every cooldown by one turn, like reduce_attack_cd() of the Commando and the Tank
+        """
+        self.cooldown = array("i", [cd - 1 if cd > 0 else 0 for cd in self.cooldown])
+
+    def end_turn(self):
+        """
+        The end-of-turn tick of Engine.end_turn for the whole table: bleeding and then cooldowns.
+        Returns the indices of the units that died.
+        """
+        dead = self.take_bleeding_damage()
+        self.reduce_attack_cd()
+        return dead
+
+    def within(self, x, y, radius):
+        """
+        Returns the indices of the living units within Chebyshev distance radius of the square (x,y)
+        """
+        return [i for i, (ux, uy, a) in enumerate(zip(self.x, self.y, self.alive))
+                if a and abs(ux - x) <= radius and abs(uy - y) <= radius]
+
+    def in_range_of(self, x, y):
+        """
+        Returns the indices of the living units that have the square (x,y) in their range.
+        Line of sight is not checked.
+        """
+        return [i for i, (ux, uy, r, a) in enumerate(zip(self.x, self.y, self.range, self.alive))
+                if a and abs(ux - x) <= r and abs(uy - y) <= r]
+
+    def targets(self, index, enemies):
+        """
+        Returns the indices of the rows of the table enemies that the unit in row index has in range
+        """
+        return enemies.within(self.x[index], self.y[index], self.range[index])
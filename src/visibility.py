@@ -0,0 +1,362 @@
+
+
+class VisibilityCache():
+    """
+    A lazily filled table of line of sight results.
+    Line of sight only depends on the walls, so the table stays valid until an obstacle is added.
+    The cache remembers the obstacle version of the grid it was filled for and empties itself when it changes.
+
+    Keys are pairs of flat square indices. Line of sight is symmetric, so both directions share one entry.
+    If max_entries is given, the table is emptied when it is full.
+    """
+
+    def __init__(self, max_entries=None):
+        self.table = {}
+        self.version = None  # The obstacle version of the grid the table was filled for
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0  # Number of times the table was emptied because the walls changed
+        self.evictions = 0  # Number of times the table was emptied because it was full
+
+    def key(self, start_index, end_index, size):
+        """
+        Returns the table key of a pair of flat indices
+        """
+        if start_index > end_index:
+            start_index, end_index = end_index, start_index
+        return start_index * size + end_index
+
+    def validate(self, version):
+        """
+        Empties the table if the walls have changed since it was filled
+        """
+        if version != self.version:
+            if self.table:
+                self.invalidations += 1
+            self.table.clear()
+            self.version = version
+
+    def lookup(self, key):
+        """
+        Returns the stored result for key, or None on a miss
+        """
+        result = self.table.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def store(self, key, result):
+        if self.max_entries is not None and len(self.table) >= self.max_entries:
+            self.table.clear()
+            self.evictions += 1
+        self.table[key] = result
+
+    def get_stats(self):
+        """
+        Returns a dictionary describing how well the cache performs
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.table),
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+
+def trace_line(obstacles, width, height, start, end):
+    """
+    A modified Bresenham's Line Algorithm.
+    obstacles is the flat wall layer of a Grid, and start and end are (x,y) tuples.
+    Returns False if there is a wall between the squares, True otherwise.
+
+    Besides walls on the line itself, the line is blocked when it passes diagonally between two walls.
+    """
+    # Setup initial conditions
+    x1, y1 = start
+    x2, y2 = end
+    dx = x2 - x1
+    dy = y2 - y1
+
+    # Determine how steep the line is (True if slope is larger than 1. False otherwise)
+    is_steep = abs(dy) > abs(dx)
+
+    # Rotate line around y = x to get a slope larger than 1
+    if is_steep:
+        x1, y1 = y1, x1
+        x2, y2 = y2, x2
+
+    # Swap start and end points if necessary
+    if x1 > x2:
+        x1, x2 = x2, x1
+        y1, y2 = y2, y1
+
+    # Recalculate differentials (Doesn't change anything if start and end weren't swapped)
+    dx = x2 - x1
+    dy = abs(y2 - y1)
+
+    # Calculate error
+    error = dx // 2
+    ystep = 1 if y1 < y2 else -1
+
+    # The two squares that block the line together if both are walls: one step along y and one along x
+    # (measured in the original orientation). A line of a single square looks the other way.
+    if x1 < x2:
+        offset_y = ystep
+        offset_x = 1
+    else:
+        offset_y = 1
+        offset_x = -1
+
+    # Iterate over bounding box generating points between start and end
+    y = y1
+
+    for x in range(x1, x2 + 1):
+        if is_steep:
+            cx, cy = y, x
+        else:
+            cx, cy = x, y
+
+        if obstacles[cx * height + cy]:  # If current tile is a wall, there is no line of sight
+            return False
+
+        ny = cy + offset_y
+        nx = cx + offset_x
+        if 0 <= ny < height and obstacles[cx * height + ny] and 0 <= nx < width and obstacles[nx * height + cy]:
+            return False
+
+        error -= dy
+        if error < 0:
+            y += ystep
+            error += dx
+
+    return True
+
+
+_shadow_tables = {}  # radius: (wall shadows, corner shadows, corner partners)
+
+
+def line_template(dx, dy):
+    """
+    Returns the squares that decide line of sight from (0,0) to (dx,dy) in trace_line:
+    a list of squares that must not be walls and a list of square pairs that must not both be walls.
+    The squares are relative to the start, so the same template works for every start square.
+    """
+    x1, y1 = 0, 0
+    x2, y2 = dx, dy
+    is_steep = abs(dy) > abs(dx)
+
+    if is_steep:
+        x1, y1 = y1, x1
+        x2, y2 = y2, x2
+
+    if x1 > x2:
+        x1, x2 = x2, x1
+        y1, y2 = y2, y1
+
+    run = x2 - x1
+    rise = abs(y2 - y1)
+    error = run // 2
+    ystep = 1 if y1 < y2 else -1
+
+    if x1 < x2:
+        offset_y = ystep
+        offset_x = 1
+    else:
+        offset_y = 1
+        offset_x = -1
+
+    squares = []
+    corners = []
+    y = y1
+
+    for x in range(x1, x2 + 1):
+        if is_steep:
+            cx, cy = y, x
+        else:
+            cx, cy = x, y
+
+        squares.append((cx, cy))
+        corners.append(((cx, cy + offset_y), (cx + offset_x, cy)))
+
+        error -= rise
+        if error < 0:
+            y += ystep
+            error += run
+
+    return squares, corners
+
+
+def shadow_table(radius):
+    """
+    Returns the precomputed shadows for a view radius (Chebyshev distance).
+    wall_shadows maps a square (relative to the viewer) to the squares a wall there hides.
+    corner_shadows maps a pair of squares to the squares hidden when both of them are walls,
+    and corner_partners lists the pairs each square belongs to.
+    """
+    table = _shadow_tables.get(radius)
+    if table is not None:
+        return table
+
+    wall_shadows = {}
+    corner_shadows = {}
+    corner_partners = {}
+
+    for dx in range(-radius, radius + 1):
+        for dy in range(-radius, radius + 1):
+            squares, corners = line_template(dx, dy)
+            for square in squares:
+                wall_shadows.setdefault(square, []).append((dx, dy))
+            for pair in corners:
+                if pair not in corner_shadows:
+                    corner_shadows[pair] = []
+                    corner_partners.setdefault(pair[0], []).append(pair)
+                corner_shadows[pair].append((dx, dy))
+
+    table = (wall_shadows, corner_shadows, corner_partners)
+    _shadow_tables[radius] = table
+    return table
+
+
+def field_of_view(obstacles, width, height, origin, radius):
+    """
+    Returns the set of (x,y) squares within Chebyshev distance radius of origin that origin has line of sight to.
+
+    Every wall in range casts a precomputed shadow (the squares whose line from origin it blocks),
+    and so does every pair of walls that meet diagonally, following the corner rule of trace_line.
+    The squares left unshadowed are exactly those for which trace_line finds line of sight,
+    found in one pass over the squares in range instead of one line per square.
+    """
+    wall_shadows, corner_shadows, corner_partners = shadow_table(radius)
+    ox, oy = origin
+    x_low = max(0, ox - radius)
+    x_high = min(width - 1, ox + radius)
+    y_low = max(0, oy - radius)
+    y_high = min(height - 1, oy + radius)
+
+    # Walls in range, relative to origin. Walls outside the range can't be on a line inside it,
+    # but a corner pair may reach one square further
+    walls = set()
+    for x in range(max(0, x_low - 1), min(width - 1, x_high + 1) + 1):
+        row = x * height
+        for y in range(max(0, y_low - 1), min(height - 1, y_high + 1) + 1):
+            if obstacles[row + y]:
+                walls.add((x - ox, y - oy))
+
+    hidden = set()
+    for wall in walls:
+        shadow = wall_shadows.get(wall)
+        if shadow is not None:
+            hidden.update(shadow)
+        for pair in corner_partners.get(wall, ()):
+            if pair[1] in walls:
+                hidden.update(corner_shadows[pair])
+
+    visible = set()
+    for x in range(x_low, x_high + 1):
+        for y in range(y_low, y_high + 1):
+            if (x - ox, y - oy) not in hidden:
+                visible.add((x, y))
+
+    return visible
+
+
+_BITS = bytes.maketrans(b"\x00\x01", b"01")  # Turns a wall layer into the digits of a binary number
+
+
+class SightMasks():
+    """
+    Line of sight from every square of a grid along any offset (dx,dy), for batches of queries.
+
+    The squares a line passes depend only on the offset from its start to its end (see line_template),
+    so one mask per offset answers every pair with that offset: bit i is set if the square with flat index i
+    sees the square (dx,dy) away. The walls are kept as one big integer with a bit per square, and a mask is
+    built from it with a shift for every square of the template, OR-ed together for the whole grid at once.
+    Masks are built the first time an offset is asked for and kept, so they must be thrown away when a wall is added.
+    """
+
+    def __init__(self, obstacles, width, height):
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.full = (1 << self.size) - 1
+        self.walls = int(bytes(obstacles[::-1]).translate(_BITS), 2) if self.size else 0
+        self.layers = {}  # (x,y): the walls shifted so that bit i is the wall (x,y) away from square i
+        self.masks = {}  # (dx,dy): bytes with bit i set if square i sees the square (dx,dy) away
+
+    def layer(self, square):
+        """
+        Returns the walls seen from square (x,y) away: bit i is set if that square from i is a wall.
+        Only squares inside the grid count, so a relative square across an edge never reports a wall.
+        """
+        layer = self.layers.get(square)
+        if layer is not None:
+            return layer
+
+        x, y = square
+        width = self.width
+        height = self.height
+        offset = x * height + y
+        if offset >= 0:
+            layer = self.walls >> offset
+        else:
+            layer = (self.walls << -offset) & self.full
+
+        # The squares i for which (x,y) away is inside the grid: a band of rows repeated over a range of columns
+        low_y, high_y = max(0, -y), min(height, height - y)
+        low_x, high_x = max(0, -x), min(width, width - x)
+        if low_y >= high_y or low_x >= high_x:
+            layer = 0
+        else:
+            column = (1 << high_y) - (1 << low_y)
+            columns = ((1 << (height * high_x)) - (1 << (height * low_x))) // ((1 << height) - 1)
+            layer &= column * columns
+
+        self.layers[square] = layer
+        return layer
+
+    def mask(self, dx, dy):
+        """
+        Returns the mask of the offset (dx,dy) as bytes: bit i is set if square i sees the square (dx,dy) away
+        """
+        mask = self.masks.get((dx, dy))
+        if mask is not None:
+            return mask
+
+        squares, corners = line_template(dx, dy)
+        blocked = 0
+        for square in squares:
+            blocked |= self.layer(square)
+        for a, b in corners:
+            blocked |= self.layer(a) & self.layer(b)
+
+        mask = (~blocked & self.full).to_bytes((self.size + 7) // 8, "little")
+        self.masks[(dx, dy)] = mask
+        return mask
+
+    def trace(self, pairs):
+        """
+        trace_line for a batch of square pairs, given as a list of ((x1,y1), (x2,y2)) tuples.
+        Returns a list of booleans in the same order.
+        """
+        height = self.height
+        results = []
+        for (x1, y1), (x2, y2) in pairs:
+            mask = self.masks.get((x2 - x1, y2 - y1))
+            if mask is None:
+                mask = self.mask(x2 - x1, y2 - y1)
+            index = x1 * height + y1
+            results.append(mask[index >> 3] >> (index & 7) & 1 == 1)
+        return results
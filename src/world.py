@@ -1,9 +1,15 @@
-from square import Square
+from grid import Grid
 from player import Player
 from sniper import Sniper
 from commando import Commando
 from ravager import Ravager
+from visibility import VisibilityCache, SightMasks, trace_line, field_of_view
 import a_star
+import damage_table
+from unit_table import UnitTable
+from spatial_index import SpatialIndex
+from attack_matrix import AttackMatrix
+from array import array
 import random
 
 """
@@ -21,32 +27,38 @@ class World():
 
     def __init__(self, width, height):
 
-        self.grid = [None] * width
-        for x in range(width):
-            self.grid[x] = [None] * height
-            for y in range(height):
-                self.grid[x][y] = Square(x, y)  # Fills every square of the grid with a Square object
+        self.grid = Grid(width, height)  # Obstacles, units and neighbours of every square in flat arrays
 
         self.player_units = []  # A list of unit-objects owned by the player
         self.ai_units = []  # A list of unit-objects owned by the AI
+        self.reach_cache = {}  # unit: (grid version, location, squares the unit can move to)
+        self.visibility = VisibilityCache()  # Line of sight results, valid until the walls change
+        self.views = (None, {})  # (obstacle version, {(location, radius): field of view})
+        self.sight_masks = (None, None)  # (obstacle version, SightMasks) for line_of_sight_many
+        self.unit_index = [SpatialIndex(width, height), SpatialIndex(width, height)]  # Units by location, per side
+        self.distance_fields = {}  # side: (state key, distances to the units of side)
+        self.unit_versions = [0, 0]  # Incremented when a unit of the side moves, dies or changes, see units_changed
+        self.threat_maps = {}  # (side, defender type, defender armour): (state key, damage map)
+        self.coverage_maps = {}  # (side, attack range): (state key, (coverage, fields of view))
+        self.attack_matrices = {}  # side: AttackMatrix of the attacks side can make
 
     def get_width(self):
         """
         Returns the width of the grid in squares (int).
         """
-        return len(self.grid)
+        return self.grid.width
 
     def get_height(self):
         """
         Returns the height of the grid in squares (int).
         """
-        return len(self.grid[0])
+        return self.grid.height
 
     def get_square(self, x, y):
         """
         Returns the Square-object in given coordinates (x,y).
         """
-        return self.grid[x][y]
+        return self.grid.get_square(x, y)
 
     def add_obstacles(self):
         """
@@ -58,7 +70,7 @@ class World():
         width = self.get_width()
 
         for i in range(width):
-            self.grid[random.randint(1, width - 2)][random.randint(1, width - 2)].turn_into_obstacle()
+            self.grid.set_obstacle(random.randint(1, width - 2), random.randint(1, width - 2))
 
     def add_unit_to_battlefield(self, unit):
         """
@@ -78,7 +90,9 @@ class World():
                 unit.update_location(self.get_height() - 1, World.FIRST_UNIT_INDEX)
                 square.add_unit_to_square(unit)
                 self.player_units.append(unit)
+                self.unit_index[0].insert(unit, self.get_height() - 1, World.FIRST_UNIT_INDEX)
                 World.FIRST_UNIT_INDEX += 1
+                self.units_changed(0)
 
 
 
@@ -86,7 +100,39 @@ class World():
             square = self.get_square(0, World.FIRST_UNIT_INDEX)
             unit.update_location(0, World.FIRST_UNIT_INDEX)
             square.add_unit_to_square(unit)
+            self.unit_index[1].insert(unit, 0, World.FIRST_UNIT_INDEX)
             World.FIRST_UNIT_INDEX += 1
+            self.units_changed(1)
+
+    def move_unit(self, unit, x, y):
+        """
+        Moves unit from its current square to the square in coordinates (x,y).
+        Does not check whether the move is allowed, see can_move.
+        """
+        matrices = [matrix for matrix in self.attack_matrices.values() if matrix.is_valid()]
+        location = unit.get_location()
+        self.get_square(location[0], location[1]).remove_unit_from_square()
+        self.get_square(x, y).add_unit_to_square(unit)
+        unit.update_location(x, y)
+
+        for index in self.unit_index:
+            if unit in index.entries:
+                index.move(unit, x, y)
+        self.units_changed(0 if isinstance(unit.get_owner(), Player) else 1)
+
+        for matrix in matrices:  # Only the moved unit's part of a valid matrix needs updating
+            matrix.unit_moved(unit)
+
+    def units_changed(self, *sides):
+        """
+        Records that units of the given sides (0 for the player, 1 for the AI) have moved, died or changed state.
+        Caches built from the units compare these versions instead of looking at every unit.
+        The World calls this for the units it moves, adds and removes, and the Engine after attacks,
+        the end of a turn and undo. Code that changes units directly has to call it too.
+        Without sides, both sides have changed.
+        """
+        for side in sides or (0, 1):
+            self.unit_versions[side] += 1
 
     def get_player_units(self):
         """
@@ -100,6 +146,77 @@ class World():
         """
         return self.ai_units
 
+    def get_forces(self, side):
+        """
+        Returns the units of one side and the units of its enemy as a tuple of two lists.
+        :param side (int): 0 for the player, 1 for the AI
+        """
+        if side == 0:
+            return self.player_units, self.ai_units
+        return self.ai_units, self.player_units
+
+    def get_attack_matrix(self, side):
+        """
+        Returns the AttackMatrix of the attacks side can make, building a new one if the state has changed
+        :param side (int): 0 for the player, 1 for the AI
+        """
+        matrix = self.attack_matrices.get(side)
+        if matrix is None or not matrix.is_valid():
+            matrix = AttackMatrix(self, side)
+            self.attack_matrices[side] = matrix
+        return matrix
+
+    def get_unit_index(self, side):
+        """
+        Returns the SpatialIndex of the units of one side.
+        The index is kept up to date by add_unit_to_battlefield, place_unit, move_unit, remove_unit and restore_unit.
+        :param side (int): 0 for the player, 1 for the AI
+        """
+        return self.unit_index[side]
+
+    def get_enemy_index(self, unit):
+        """
+        Returns the SpatialIndex of the enemies of unit
+        """
+        if isinstance(unit.get_owner(), Player):
+            return self.get_unit_index(1)
+        return self.get_unit_index(0)
+
+    def enemies_in_range(self, unit, location=None):
+        """
+        Returns the enemies within unit's range of location (default: the unit's own square), in list order.
+        Line of sight is not checked.
+        """
+        x, y = location or unit.get_location()
+        return self.get_enemy_index(unit).within(x, y, unit.get_range())
+
+    def get_enemies(self, unit):
+        """
+        Returns the list of units that are enemies of unit
+        """
+        if isinstance(unit.get_owner(), Player):
+            return self.ai_units
+        return self.player_units
+
+    def get_unit_table(self, side):
+        """
+        Returns a new UnitTable of the units of one side, see unit_table.py
+        :param side (int): 0 for the player, 1 for the AI
+        """
+        return UnitTable.from_units(self.get_forces(side)[0])
+
+    def place_unit(self, unit, x, y):
+        """
+        Puts unit on the square in coordinates (x,y) and adds it to its owner's forces.
+        Unlike add_unit_to_battlefield, the square is chosen freely and there is no limit on the number of units.
+        """
+        side = 0 if isinstance(unit.get_owner(), Player) else 1
+        self.get_square(x, y).add_unit_to_square(unit)
+        unit.update_location(x, y)
+        self.get_forces(side)[0].append(unit)
+        self.unit_index[side].insert(unit, x, y)
+        self.units_changed(side)
+
     def add_ai_unit(self, unit):
         """
         Appends a unit-object to the ai's forces
@@ -113,9 +230,17 @@ class World():
         World.FIRST_UNIT_INDEX = 0
 
     def update_square_neighbours(self):
-        for row in self.grid:
-            for square in row:
-                square.update_neighbours(self.grid, self.get_width(), self.get_height())
+        """
+        Rebuilds the neighbours of every square.
+        The grid keeps the neighbours up to date on every change, so this is only needed for validation.
+        """
+        self.grid.rebuild_neighbours()
+
+    def neighbours_consistent(self):
+        """
+        Returns True if the incrementally updated neighbours match a full rebuild
+        """
+        return self.grid.neighbours_consistent()
 
     def get_grid(self):
         """
@@ -123,6 +248,19 @@ class World():
         """
         return self.grid
 
+    def get_pathfinder(self):
+        """
+        Returns the pathfinder of the world grid: the A* engine unless another one was chosen with set_pathfinder
+        """
+        return a_star.get_finder(self.grid)
+
+    def set_pathfinder(self, finder):
+        """
+        Makes move_closer and a_star.a_star use finder on this world, for example a HierarchicalPathFinder
+        on very large maps. None goes back to the A* engine.
+        """
+        a_star.select(self.grid, finder)
+
     def remove_unit(self, unit, player):
         """
         Removes a dead unit from the world.
@@ -140,153 +278,345 @@ class World():
         else:
             self.ai_units.remove(unit)
 
-        self.update_square_neighbours()
+        self.unit_index[player].remove(unit)
+        self.units_changed(player)
+
+        self.reach_cache.pop(unit, None)
+
+    def restore_unit(self, unit, player, position, sequence=None):
+        """
+        Puts a unit removed with remove_unit back on its square. Used to undo actions.
+
+        :param player (int): 0 if the unit belongs to the player, 1 for AI
+        :param position: The index the unit had in its side's unit list
+        :param sequence: The sequence number the unit had in the spatial index
+        """
+        location = unit.get_location()
+        self.get_square(location[0], location[1]).add_unit_to_square(unit)
+        self.get_forces(player)[0].insert(position, unit)
+        self.unit_index[player].insert(unit, location[0], location[1], sequence)
+        self.units_changed(player)
 
     def line_of_sight(self, start, end):
         """
-        A modified Bresenham's Line Algorithm
         start and end are tuples of (x,y) coordinates.
         If there is a wall between them, return False. Otherwise return True.
+        Results are cached until the walls change.
         """
-        width = self.get_width()
-        height = self.get_height()
-
-        # Setup initial conditions
-        x1, y1 = start
-        x2, y2 = end
-        dx = x2 - x1
-        dy = y2 - y1
+        grid = self.grid
+        height = grid.height
+        size = grid.width * height
 
-        # Determine how steep the line is (True if slope is larger than 1. False otherwise)
-        is_steep = abs(dy) > abs(dx)
+        self.visibility.validate(grid.obstacle_version)
+        key = self.visibility.key(start[0] * height + start[1], end[0] * height + end[1], size)
+        result = self.visibility.lookup(key)
+        if result is None:
+            result = self.trace_line_of_sight(start, end)
+            self.visibility.store(key, result)
 
-        # Rotate line around y = x to get a slope larger than 1
-        if is_steep:
-            x1, y1 = y1, x1
-            x2, y2 = y2, x2
+        return result
 
-        # Swap start and end points if necessary
-        if x1 > x2:
-            x1, x2 = x2, x1
-            y1, y2 = y2, y1
-
-        # Recalculate differentials (Doesn't change anything if start and end weren't swapped)
-        dx = x2 - x1
-        dy = y2 - y1
+    def get_visibility_stats(self):
+        """
+        Returns the hit and miss statistics of the line of sight cache
+        """
+        return self.visibility.get_stats()
 
-        # Calculate error
-        error = int(dx / 2.0)
-        ystep = 1 if y1 < y2 else -1
+    def trace_line_of_sight(self, start, end):
+        """
+        A modified Bresenham's Line Algorithm (see visibility.trace_line)
+        start and end are tuples of (x,y) coordinates.
+        If there is a wall between them, return False. Otherwise return True.
+        """
+        return trace_line(self.grid.obstacles, self.get_width(), self.get_height(), start, end)
 
-        if ystep == -1 and x1 < x2:
-            offsetx = [0, 1]
-            offsety = [-1, 0]
-            # Left descending
+    def line_of_sight_many(self, sources, targets):
+        """
+        Checks line of sight for many pairs of squares in one call.
+        sources and targets are equally long lists of (x,y) tuples and pair i is (sources[i], targets[i]).
+        Returns a list of booleans in the same order.
 
-        elif ystep == -1 and x1 > x2:
-            offsetx = [0, -1]
-            offsety = [-1, 0]
-            # Left ascending
+        Every pair is a lookup in the mask of its offset (see visibility.SightMasks).
+        The masks are shared by all pairs and calls until the walls change.
+        """
+        grid = self.grid
+        version, masks = self.sight_masks
+        if version != grid.obstacle_version:
+            masks = SightMasks(grid.obstacles, grid.width, grid.height)
+            self.sight_masks = (grid.obstacle_version, masks)
 
-        elif ystep == 1 and x1 < x2:
-            offsetx = [0, 1]
-            offsety = [1, 0]
-            # Right descending
+        return masks.trace(list(zip(sources, targets)))
 
-        else:
-            offsetx = [0, -1]
-            offsety = [1, 0]
-            # Right ascending
+    def visible_enemies(self, units):
+        """
+        Returns a (unit, enemy) tuple for every enemy each of units has in range and line of sight, in list order.
+        Line of sight is checked for all the pairs in one batch with line_of_sight_many.
+        """
+        pairs = [(unit, enemy) for unit in units for enemy in self.enemies_in_range(unit)]
+        sights = self.line_of_sight_many([unit.get_location() for unit, enemy in pairs],
+                                         [enemy.get_location() for unit, enemy in pairs])
+        return [pair for pair, sight in zip(pairs, sights) if sight]
 
-        # Iterate over bounding box generating points between start and end
-        y = y1
+    def field_of_view(self, location, radius):
+        """
+        Returns the set of (x,y) squares within radius (Chebyshev distance) of location
+        that location has line of sight to. Agrees with line_of_sight for every square.
+        Results are kept until the walls change, so the returned set is shared and must not be modified.
+        """
+        version, views = self.views
+        if version != self.grid.obstacle_version:
+            views = {}
+            self.views = (self.grid.obstacle_version, views)
 
-        for x in range(x1, x2 + 1):
-            coord = (y, x) if is_steep else (x, y)
-            neighbours = 0
+        view = views.get((location, radius))
+        if view is None:
+            view = field_of_view(self.grid.obstacles, self.get_width(), self.get_height(), location, radius)
+            views[(location, radius)] = view
+        return view
 
-            if self.grid[coord[0]][
-                coord[1]].is_obstacle():  # If current tile is a wall, there is no line of sight, return False
-                return False
+    def get_threat_map(self, side, defender):
+        """
+        Returns how much damage the units of side are expected to deal to defender on every square:
+        a flat array indexed like the grid (x * height + y) holding the sum of average_damage()
+        of every unit of side that has the square in range and in line of sight.
+        Seen from the other side it is an influence map of side's firepower.
 
-            for i in range(2):
-                nx = coord[0] + offsetx[i]
-                ny = coord[1] + offsety[i]
-                if nx < 0 or nx > width - 1 or ny < 0 or ny > height - 1:
-                    continue
-                if self.grid[nx][ny].is_obstacle():
-                    neighbours += 1
+        Maps are kept per defender type and armour until the walls change or the version of side changes
+        (see units_changed), which in practice means they are computed once per turn.
+        """
+        units = self.get_forces(side)[0]
+        key = (side, type(defender), defender.get_armour())
+        state = (self.grid.obstacle_version, self.unit_versions[side])
+        cached = self.threat_maps.get(key)
+        if cached is not None and cached[0] == state:
+            return cached[1]
 
-            if neighbours == 2:
-                return False
+        height = self.get_height()
+        threat = array("d", [0.0]) * (self.get_width() * height)
+        for unit in units:
+            damage = unit.average_damage(defender)
+            for x, y in self.field_of_view(unit.get_location(), unit.get_range()):
+                threat[x * height + y] += damage
 
-            error -= abs(dy)
-            if error < 0:
-                y += ystep
-                error += dx
+        self.threat_maps[key] = (state, threat)
+        return threat
 
-        return True
+    def get_exposure(self, unit, square):
+        """
+        Returns the damage the enemies of unit are expected to deal to it if it stands on square
+        """
+        side = 0 if isinstance(unit.get_owner(), Player) else 1
+        x, y = square.get_location()
+        return self.get_threat_map(1 - side, unit)[x * self.get_height() + y]
 
-    def get_best_move(self):
+    def get_best_move(self, side=1):
         """
         Loops over all possible moves.
-        Best move is defined here as one that gets you in range and line of sight to attack
+        Best move is defined here as one that gets you in range and line of sight to attack.
+        Of those, the one to the square least exposed to enemy fire (see get_threat_map) is chosen
+        :param side (int): The side that moves, 1 for the AI (default) or 0 for the player
         """
+        units = self.get_forces(side)[0]
+        matrix = self.get_attack_matrix(side)
         moves = []
-        for unit in self.ai_units:
-            can_att = False
-            for enemy in self.player_units:
-                if self.can_attack(unit, enemy):
-                    can_att = True
-            if can_att:  # If unit can attack an enemy, it shouldn't move
-                continue
-
-            square, enemy = self.move_closer(unit)
+        for unit in units:
+            if matrix.get_targets(unit):
+                continue  # If unit can attack an enemy, it shouldn't move
+
+            square = self.step_toward_enemies(unit)
             if square is not None:  # If unit can move closer
                 moves.append((unit, square)) # remember the unit, square and enemy
 
+        best = None
+        exposure = 0
         for move in moves:
             if self.can_attack_from_square(move[0], move[1]):
-                return move[0], move[1]
+                temp_exposure = self.get_exposure(move[0], move[1])
+                if best is None or temp_exposure < exposure:
+                    best = move
+                    exposure = temp_exposure
+
+        if best is not None:
+            return best[0], best[1]
 
         if len(moves) > 0:
             return moves[0][0], moves[0][1]
 
         return None, None
 
-    def can_attack_from_square(self, unit, square):
-        x, y = square.get_location()
+    def get_coverage(self, side, attack_range):
+        """
+        Returns the squares from which a unit with attack_range can attack a unit of side,
+        as a flat bytearray indexed like the grid (x * height + y) that is 1 for those squares.
 
-        for enemy in self.player_units:
-            delta_x = abs(x - enemy.get_location()[0])
-            delta_y = abs(y - enemy.get_location()[1])
+        A unit of side is attackable from every square in its own field of view within attack_range.
+        Maps are kept until the walls change or the version of side changes (see units_changed),
+        i.e. about once per turn.
+        """
+        return self.get_coverage_entry(side, attack_range)[0]
 
-            if max(delta_x, delta_y) <= unit.get_range():
-                if self.line_of_sight((x,y), enemy.get_location()):
-                    return True
+    def get_coverage_entry(self, side, attack_range):
+        """
+        Returns the coverage map of get_coverage() and the field of view of every unit of side it was built from,
+        as a list of (unit, set of squares) tuples in list order
+        """
+        units = self.get_forces(side)[0]
+        key = (side, attack_range)
+        state = (self.grid.obstacle_version, self.unit_versions[side])
+        cached = self.coverage_maps.get(key)
+        if cached is not None and cached[0] == state:
+            return cached[1]
 
-        return False
+        height = self.get_height()
+        coverage = bytearray(self.get_width() * height)
+        views = []
+        for unit in units:
+            view = self.field_of_view(unit.get_location(), attack_range)
+            views.append((unit, view))
+            for x, y in view:
+                coverage[x * height + y] = 1
 
+        self.coverage_maps[key] = (state, (coverage, views))
+        return coverage, views
 
-    def can_move(self, unit, square):
+    def attackable_from(self, unit, square):
         """
-        Returns True if unit can move to square
-        Returns False otherwise
+        Returns the list of enemies unit could attack from square, in list order
         """
+        side = 1 if isinstance(unit.get_owner(), Player) else 0
+        location = square.get_location()
+        views = self.get_coverage_entry(side, unit.get_range())[1]
+        return [enemy for enemy, view in views if location in view]
 
-        if not square.is_free():
-            return False
-        xs, ys = square.get_location()
-        xu, yu = unit.get_location()[0], unit.get_location()[1]
-        distance = abs(xs - xu) + abs(ys - yu)  # Manhattan distance
+    def can_attack_from_square(self, unit, square):
+        """
+        Returns True if unit could attack an enemy from square
+        """
+        side = 1 if isinstance(unit.get_owner(), Player) else 0
+        x, y = square.get_location()
+        return self.get_coverage(side, unit.get_range())[x * self.get_height() + y] == 1
 
-        if distance > unit.get_speed():
-            return False
 
-        if a_star.a_star(self.grid, self.get_square(xu, yu), self.get_square(xs, ys), False) <= unit.get_speed():
-            return True
+    def get_reachable(self, unit):
+        """
+        Returns a dictionary of the squares unit can move to this turn.
+        Keys are (x,y) tuples and values the number of steps needed, in the order they were found.
 
-        return False
+        The squares are found with a breadth-first search limited by the unit's speed.
+        The result is cached until the grid changes.
+        """
+        location = unit.get_location()
+        cached = self.reach_cache.get(unit)
+        if cached is not None and cached[0] == self.grid.version and cached[1] == location:
+            return cached[2]
+
+        grid = self.grid
+        height = grid.height
+        masks = grid.neighbour_masks
+        steps = (-1, height, 1, -height)  # LEFT, DOWN, RIGHT, UP as index offsets
+        speed = unit.get_speed()
+
+        start = location[0] * height + location[1]
+        seen = {start}
+        reachable = {}
+        layer = [start]
+
+        for distance in range(1, speed + 1):
+            next_layer = []
+            for current in layer:
+                mask = masks[current]
+                for i in range(4):
+                    if not mask & (1 << i):
+                        continue
+                    neighbour = current + steps[i]
+                    if neighbour in seen:
+                        continue
+                    seen.add(neighbour)
+                    reachable[divmod(neighbour, height)] = distance
+                    next_layer.append(neighbour)
+            layer = next_layer
+
+        self.reach_cache[unit] = (grid.version, location, reachable)
+        return reachable
+
+    def can_move(self, unit, square):
+        """
+        Returns True if unit can move to square
+        Returns False otherwise
+        """
+        return square.get_location() in self.get_reachable(unit)
+
+    def get_distance_field(self, side):
+        """
+        Returns the number of steps from every square to the closest square next to a unit of side,
+        as a flat array indexed like the grid (x * height + y). Squares that can't get there are -1.
+        Only walls and the units of side block the way: the other side's units move during their turn,
+        so they are left out and their moves don't change the field.
+
+        The field is found with one breadth-first search started from all those squares at once.
+        It is kept until the walls change or a unit of side moves or dies.
+        """
+        units = self.get_forces(side)[0]
+        state = (self.grid.obstacle_version, tuple(unit.get_location() for unit in units))
+        cached = self.distance_fields.get(side)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+
+        grid = self.grid
+        width = grid.width
+        height = grid.height
+        blocked = bytearray(grid.obstacles)  # Walls and the units of side
+        for unit in units:
+            blocked[unit.get_location()[0] * height + unit.get_location()[1]] = 1
+        field = array("i", [-1]) * (width * height)
+
+        layer = []
+        for unit in units:
+            x, y = unit.get_location()
+            for index, inside in ((x * height + y - 1, y > 0), ((x + 1) * height + y, x < width - 1),
+                                  (x * height + y + 1, y < height - 1), ((x - 1) * height + y, x > 0)):
+                if inside and not blocked[index] and field[index] == -1:
+                    field[index] = 0
+                    layer.append(index)
+
+        distance = 0
+        while layer:
+            distance += 1
+            next_layer = []
+            for current in layer:
+                x, y = divmod(current, height)
+                for neighbour, inside in ((current - 1, y > 0), (current + height, x < width - 1),
+                                          (current + 1, y < height - 1), (current - height, x > 0)):
+                    if inside and not blocked[neighbour] and field[neighbour] == -1:
+                        field[neighbour] = distance
+                        next_layer.append(neighbour)
+            layer = next_layer
+
+        self.distance_fields[side] = (state, field)
+        return field
+
+    def step_toward_enemies(self, unit):
+        """
+        Returns the square unit can move to this turn that is closest to any enemy by path length,
+        read from the distance field of the enemies. Ties go to the square that takes fewer steps.
+        Returns None if the unit can't get any closer.
+        """
+        side = 0 if isinstance(unit.get_owner(), Player) else 1
+        field = self.get_distance_field(1 - side)
+        height = self.grid.height
+        x, y = unit.get_location()
+
+        best = None
+        best_distance = field[x * height + y]  # The unit's own distance, -1 if no enemy can be reached
+        for (sx, sy) in self.get_reachable(unit):
+            distance = field[sx * height + sy]
+            if distance >= 0 and (best_distance == -1 or distance < best_distance):
+                best_distance = distance
+                best = (sx, sy)
+
+        if best is None:
+            return None
+        return self.get_square(best[0], best[1])
 
     def move_closer(self, unit):
         """
@@ -294,24 +624,21 @@ class World():
         """
         xu = unit.get_location()[0]
         yu = unit.get_location()[1]
-        closest = None  # closest enemy
-        distance = float("inf")
-
-        for enemy in self.player_units:
-            delta_x = abs(xu - enemy.get_location()[0])
-            delta_y = abs(yu - enemy.get_location()[1])
-            temp_dist = delta_y + delta_x
-            if temp_dist < distance:
-                distance = temp_dist
-                closest = enemy
-
-        enemy_square = self.get_square(closest.get_location()[0], closest.get_location()[1])
-        for neighbour in enemy_square.get_neighbours():
-            path, success = a_star.a_star(self.grid, self.get_square(xu, yu), neighbour, True)
-            if success:
-                for square in path:
-                    if self.can_move(unit, square):
-                        return square, closest
+        closest, distance = self.get_enemy_index(unit).nearest(xu, yu)  # closest enemy, first in the list on ties
+        if closest is None:
+            return None, None
+
+        # One search finds which of the free squares next to the enemy is reached first (in neighbour order)
+        goals = self.grid.get_neighbours(closest.get_location()[0], closest.get_location()[1])
+        goal = self.get_pathfinder().first_reachable((xu, yu), goals)
+        if goal is None:
+            return None, None
+
+        path, cost = self.get_pathfinder().search((xu, yu), goal)
+        reachable = self.get_reachable(unit)
+        for x, y in reversed(path):  # The square furthest along the path that the unit can move to
+            if (x, y) in reachable:
+                return self.get_square(x, y), closest
 
         return None, None
 
@@ -338,6 +665,19 @@ class World():
         else:
             return False
 
+    def kill_probability(self, unit, enemy, horizon=0):
+        """
+        Returns the probability that the best attack unit can use right now kills enemy,
+        read from the exact damage tables.
+        :param horizon: Number of end-of-turn bleed ticks to count after the attack (0 counts only the attack)
+        """
+        best = 0.0
+        for attack in unit.damage_model(enemy):
+            table = damage_table.get_table(unit, attack[0], enemy)
+            best = max(best, table.kill_probability(enemy.get_hitpoints(), enemy.bleed, horizon))
+
+        return best
+
     def can_attack(self, unit, enemy):
         """
         Method that checks if unit can attack enemy
@@ -367,24 +707,24 @@ class World():
 
         return score
 
-    def ai_attack(self):
+    def ai_attack(self, side=1):
         """
         Finds the ai unit that should attack this turn and player unit to be attacked
+        :param side (int): The side that attacks, 1 for the AI (default) or 0 for the player
         """
+        units = self.get_forces(side)[0]
+        matrix = self.get_attack_matrix(side)
         score = 0
         attacks = {}
 
-        for unit in self.ai_units:
-            for enemy in self.player_units:
-
-                if self.can_attack(unit, enemy):
-                    if self.can_kill(unit, enemy):
-                        return unit, enemy
+        for unit in units:
+            for enemy, kill, temp_score in matrix.get_targets(unit):
+                if kill:
+                    return unit, enemy
 
-                    temp_score = self.best_attack(unit, enemy)
-                    if temp_score > score:
-                        score = temp_score
-                    attacks[temp_score] = (unit, enemy)
+                if temp_score > score:
+                    score = temp_score
+                attacks[temp_score] = (unit, enemy)
 
         if len(attacks) > 0:
             return attacks[score]
@@ -0,0 +1,146 @@
+import random
+from player import Player
+
+"""
+Zobrist hashing of game states and a transposition table for search-based AIs.
+
+A state hash is the XOR of a random 64-bit key for every feature of the state: each unit's side, type and square,
+its hitpoints (in buckets of HP_BUCKET), bleed, armour and cooldown, and the side to move with its turn flags.
+Keys are drawn on first use from a generator of their own, so hashing never changes the game's random rolls.
+Because XOR undoes itself, an action only has to XOR out the features it changes and XOR in the new ones.
+The walls are not part of the hash: a table is only meaningful for one map.
+"""
+
+HP_BUCKET = 10  # Hitpoints that differ by less than this can share a key
+
+
+class ZobristKeys():
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.keys = {}  # feature tuple: 64-bit key
+
+    def key(self, *feature):
+        """
+        Returns the key of a feature, drawing it on first use
+        """
+        key = self.keys.get(feature)
+        if key is None:
+            key = self.random.getrandbits(64)
+            self.keys[feature] = key
+        return key
+
+    def unit_hash(self, unit):
+        """
+        Returns the hash of one unit. Units that are dead or not on the map hash to 0.
+        """
+        location = unit.get_location()
+        if location is None or not unit.is_alive():
+            return 0
+
+        x, y = location
+        side = 0 if isinstance(unit.get_owner(), Player) else 1
+        state = unit.to_tuple()
+        key = self.key
+        value = key("unit", side, unit.get_name(), x, y) ^ key("hp", x, y, state[0] // HP_BUCKET)
+        value ^= key("armour", x, y, state[1]) ^ key("bleed", x, y, state[2])
+        for i, extra in enumerate(state[5:]):  # Cooldowns and the Ravager's armour boost
+            value ^= key("extra", i, x, y, extra)
+        return value
+
+    def turn_hash(self, game):
+        """
+        Returns the hash of the side to move and of what it has already done this turn
+        """
+        value = self.key("turn", game.whose_turn() is game.get_player())
+        if game.has_moved():
+            value ^= self.key("moved")
+        if game.has_attacked():
+            value ^= self.key("attacked")
+        return value
+
+    def state_hash(self, game, world):
+        """
+        Returns the hash of the whole state, computed from scratch
+        """
+        value = self.turn_hash(game)
+        for unit in world.get_player_units() + world.get_ai_units():
+            value ^= self.unit_hash(unit)
+        return value
+
+
+class TranspositionTable():
+    """
+    A fixed number of slots of search results, indexed by the low bits of the state hash.
+    When two states want the same slot, the new entry replaces the old one if it was searched at least as deep
+    or if the old entry is from an earlier search (see new_search), so the table never grows.
+
+    An entry is (hash, depth, age, value, best action, flag). The flag tells whether value is
+    EXACT or only a LOWER or UPPER bound, as found by alpha-beta search.
+    """
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    def __init__(self, max_entries=1 << 16):
+        self.size = max_entries
+        self.slots = [None] * max_entries
+        self.age = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0  # Stores that overwrote an entry of another state
+        self.rejections = 0  # Stores that were dropped because the slot held a deeper entry of this search
+
+    def new_search(self):
+        """
+        Marks the entries stored so far as old, so new results can replace them
+        """
+        self.age += 1
+
+    def lookup(self, key):
+        """
+        Returns the entry of the state with hash key, or None on a miss
+        """
+        entry = self.slots[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value, action=None, flag=EXACT):
+        """
+        Stores a search result, unless the slot holds a deeper result of the current search
+        """
+        slot = key % self.size
+        entry = self.slots[slot]
+        if entry is not None:
+            if entry[2] == self.age and entry[1] > depth:
+                self.rejections += 1
+                return False
+            if entry[0] != key:
+                self.replacements += 1
+
+        self.slots[slot] = (key, depth, self.age, value, action, flag)
+        self.stores += 1
+        return True
+
+    def clear(self):
+        self.slots = [None] * self.size
+
+    def get_stats(self):
+        """
+        Returns a dictionary describing how well the table performs
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": sum(1 for entry in self.slots if entry is not None),
+            "stores": self.stores,
+            "replacements": self.replacements,
+            "rejections": self.rejections,
+        }